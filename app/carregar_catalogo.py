@@ -0,0 +1,102 @@
+"""Carga offline de catálogos de estrelas e planetas (CSV, FITS ou VOTable).
+
+Uso (a partir de app/):
+    python carregar_catalogo.py estrelas.csv --tipo estrela
+    python carregar_catalogo.py planetas.vot --tipo planeta --exoplanetas
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import settings
+from services.carga import FORMATOS, Carregador, Checkpoint, Relatorio, ler_lotes, mapear_colunas, processar_lote
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Carga em massa de catálogos de estrelas e planetas.")
+    parser.add_argument("arquivo", help="Arquivo CSV, FITS (.fits/.fit) ou VOTable (.vot/.xml)")
+    parser.add_argument("--tipo", choices=["estrela", "planeta"], required=True,
+                        help="Cada linha é uma estrela ou um planeta (com as colunas da estrela hospedeira)")
+    parser.add_argument("--exoplanetas", action="store_true",
+                        help="Criar também um Exoplaneta para cada planeta carregado")
+    parser.add_argument("--coluna", action="append", default=[], metavar="CAMPO=COLUNA",
+                        help="Coluna a usar para um campo do modelo (pode ser repetido)")
+    parser.add_argument("--lote", type=int, default=settings.CARGA_LOTE, help="Linhas por lote")
+    parser.add_argument("--processos", type=int, default=settings.CARGA_PROCESSOS, help="Processos de leitura")
+    parser.add_argument("--escritores", type=int, default=settings.CARGA_ESCRITORES, help="Inserções em paralelo")
+    parser.add_argument("--sem-checkpoint", action="store_true", help="Ignorar e não gravar o checkpoint")
+    return parser.parse_args()
+
+
+def main():
+    argumentos = _argumentos()
+    formato = FORMATOS.get(os.path.splitext(argumentos.arquivo)[1].lower())
+    if formato is None:
+        sys.exit(f"Formato não suportado: {argumentos.arquivo}")
+    substituicoes = dict(item.split("=", 1) for item in argumentos.coluna)
+
+    import config.database  # noqa: F401  (conecta o mongoengine só no processo principal)
+
+    estado = os.stat(argumentos.arquivo)
+    identidade = [os.path.abspath(argumentos.arquivo), estado.st_size, estado.st_mtime, argumentos.tipo, argumentos.lote]
+    checkpoint = Checkpoint(argumentos.arquivo, identidade, ativo=not argumentos.sem_checkpoint)
+    if checkpoint.concluidos:
+        print(f"Retomando a partir do lote {checkpoint.concluidos}")
+
+    cabecalho, lotes = ler_lotes(argumentos.arquivo, formato, argumentos.lote)
+    mapa = mapear_colunas(argumentos.tipo, cabecalho, substituicoes)
+    for tipo_documento, campos in mapa.items():
+        print(f"Colunas de {tipo_documento}: " + ", ".join(f"{campo}={cabecalho[posicao]}" for campo, (posicao, _) in campos.items()))
+
+    relatorio = Relatorio()
+    carregador = Carregador(argumentos.tipo, argumentos.exoplanetas, argumentos.escritores, relatorio)
+    pendentes = (
+        (indice, formato, linhas, mapa)
+        for indice, linhas in enumerate(lotes)
+        if indice >= checkpoint.concluidos
+    )
+
+    parar = threading.Event()
+
+    def reportar():
+        while not parar.wait(5):
+            print(relatorio.resumo(), flush=True)
+
+    threading.Thread(target=reportar, daemon=True).start()
+    futuros = []
+
+    def enviar(resultado):
+        indice, documentos, rejeitadas = resultado
+        relatorio.linhas += len(documentos) + rejeitadas
+        relatorio.rejeitadas += rejeitadas
+        futuros.append(carregador.enviar(indice, documentos, checkpoint.concluir))
+
+    try:
+        # spawn: os processos de conversão não herdam o MongoClient (e as threads
+        # dele) já criado neste processo, como aconteceria com fork
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=argumentos.processos, mp_context=contexto) as processos:
+            # Janela limitada de lotes em conversão, consumida na ordem do arquivo
+            # para que as referências entre estrelas e planetas sejam resolvidas em ordem
+            janela = deque()
+            for lote in pendentes:
+                janela.append(processos.submit(processar_lote, lote))
+                if len(janela) >= argumentos.processos * 2:
+                    enviar(janela.popleft().result())
+            while janela:
+                enviar(janela.popleft().result())
+    finally:
+        carregador.encerrar()
+        parar.set()
+
+    for futuro in futuros:
+        futuro.result()
+    checkpoint.remover()
+    print(relatorio.resumo())
+
+
+if __name__ == "__main__":
+    main()
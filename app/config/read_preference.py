@@ -0,0 +1,84 @@
+import time
+from fastapi import HTTPException
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+from config import settings
+
+# Intervalo de heartbeat do driver: uma secundária pode estar até
+# maxStalenessSeconds + heartbeat atrás da primária.
+HEARTBEAT_SECONDS = 10
+
+MODOS = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+PRIMARIA = Primary()
+
+
+def _preferencia(nome, variavel):
+    modo = MODOS.get(nome)
+    if modo is None:
+        raise ValueError(f"{variavel} inválido: {nome}")
+    if modo is Primary:
+        return PRIMARIA
+    return modo(max_staleness=settings.MONGO_MAX_STALENESS_SECONDS)
+
+
+def _preferencias_rotas(valor):
+    preferencias = {}
+    for item in filter(None, (parte.strip() for parte in valor.split(","))):
+        rota, _, modo = item.partition("=")
+        preferencias[rota.strip()] = _preferencia(modo.strip(), "MONGO_READ_PREFERENCE_ROTAS")
+    return preferencias
+
+
+LEITURA_CATALOGO = _preferencia(settings.MONGO_READ_PREFERENCE, "MONGO_READ_PREFERENCE")
+PREFERENCIAS_ROTAS = _preferencias_rotas(settings.MONGO_READ_PREFERENCE_ROTAS)
+
+
+def preferencia_da_rota(rota):
+    """Preferência de leitura de um grupo de rotas (ex.: "estrelas"), ou a padrão."""
+    return PREFERENCIAS_ROTAS.get(rota, LEITURA_CATALOGO)
+
+
+def gerar_token_consistencia():
+    """Token devolvido pelas escritas: instante (ms) em que a escrita foi confirmada."""
+    return str(int(time.time() * 1000))
+
+
+def preferencia_leitura(token=None, padrao=None):
+    """Escolhe o membro do replica set que atende uma leitura.
+
+    Sem token, a leitura usa `padrao` (a preferência da rota) ou a configurada
+    (por padrão secundárias com atraso limitado). Se o cliente envia o token de
+    uma escrita que uma secundária ainda pode não ter replicado, a leitura vai
+    para a primária.
+
+    O token é uma heurística de tempo, não uma garantia causal: compara o
+    relógio do worker que confirmou a escrita com o do que atende a leitura,
+    contra o atraso máximo tolerado das secundárias. Vale enquanto os relógios
+    dos workers estiverem sincronizados (NTP) e o atraso real ficar dentro de
+    `MONGO_MAX_STALENESS_SECONDS`; rotas que exigem read-your-writes estrito
+    devem usar a preferência `primary`.
+    """
+    padrao = padrao or LEITURA_CATALOGO
+    if not token:
+        return padrao
+    try:
+        escrita_ms = int(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Token de consistência inválido")
+
+    janela_ms = (settings.MONGO_MAX_STALENESS_SECONDS + HEARTBEAT_SECONDS) * 1000
+    if time.time() * 1000 - escrita_ms < janela_ms:
+        return PRIMARIA
+    return padrao
@@ -0,0 +1,103 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Preferência de leitura das rotas de consulta (primary, primaryPreferred,
+# secondary, secondaryPreferred ou nearest)
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+# Atraso máximo tolerado para uma secundária (o MongoDB exige no mínimo 90s)
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "90"))
+# Preferência por grupo de rotas, sobrepondo a padrão, ex.:
+# MONGO_READ_PREFERENCE_ROTAS=observacoes=primary,estrelas=nearest
+MONGO_READ_PREFERENCE_ROTAS = os.getenv("MONGO_READ_PREFERENCE_ROTAS", "")
+
+# Feed de observações (change streams)
+STREAM_BUFFER_CLIENTE = int(os.getenv("STREAM_BUFFER_CLIENTE", "100"))
+STREAM_HISTORICO = int(os.getenv("STREAM_HISTORICO", "1000"))
+STREAM_KEEPALIVE_SECONDS = int(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Fila de tarefas em segundo plano
+TAREFAS_WORKERS = int(os.getenv("TAREFAS_WORKERS", "1"))
+TAREFAS_HISTORICO = int(os.getenv("TAREFAS_HISTORICO", "500"))
+
+# Políticas de exclusão por relacionamento (nullify, cascade ou deny), ex.:
+# POLITICA_EXCLUSAO=Planeta.estrela=cascade,Observacao.astronomo=deny
+POLITICA_EXCLUSAO = os.getenv("POLITICA_EXCLUSAO", "")
+EXCLUSAO_LOTE = int(os.getenv("EXCLUSAO_LOTE", "1000"))
+
+# Endpoint /batch
+BATCH_MAX_REQUISICOES = int(os.getenv("BATCH_MAX_REQUISICOES", "20"))
+BATCH_CONCORRENCIA = int(os.getenv("BATCH_CONCORRENCIA", "10"))
+
+# Compressão das respostas (gzip, br ou zstd conforme Accept-Encoding)
+COMPRESSAO_MIN_BYTES = int(os.getenv("COMPRESSAO_MIN_BYTES", "1024"))
+
+# Exportação colunar (Arrow/Parquet)
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", "50000"))
+
+# Snapshot colunar em memória (NumPy) para os filtros de planetas e estrelas
+SNAPSHOT_COLUNAR = os.getenv("SNAPSHOT_COLUNAR", "0") == "1"
+
+# Controle de admissão por classe de rota: (requisições simultâneas, tamanho da
+# fila, prazo em ms para fila + consultas ao MongoDB; 0 = sem prazo)
+ADMISSAO = {
+    "leve": (
+        int(os.getenv("ADMISSAO_LEVE_CONCORRENCIA", "64")),
+        int(os.getenv("ADMISSAO_LEVE_FILA", "256")),
+        int(os.getenv("ADMISSAO_LEVE_PRAZO_MS", "2000")),
+    ),
+    "pesada": (
+        int(os.getenv("ADMISSAO_PESADA_CONCORRENCIA", "4")),
+        int(os.getenv("ADMISSAO_PESADA_FILA", "16")),
+        int(os.getenv("ADMISSAO_PESADA_PRAZO_MS", "5000")),
+    ),
+    "export": (
+        int(os.getenv("ADMISSAO_EXPORT_CONCORRENCIA", "2")),
+        int(os.getenv("ADMISSAO_EXPORT_FILA", "4")),
+        0,
+    ),
+}
+# Espera máxima na fila para classes sem prazo
+ADMISSAO_ESPERA_MAXIMA_MS = int(os.getenv("ADMISSAO_ESPERA_MAXIMA_MS", "30000"))
+ADMISSAO_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSAO_RETRY_AFTER_SECONDS", "1"))
+
+# Filtros (/filtrar): consultas compiladas em cache e tamanho a partir do qual
+# filtros sem índice (só texto) são recusados
+FILTRO_CACHE = int(os.getenv("FILTRO_CACHE", "1024"))
+FILTRO_LIMITE_VARREDURA = int(os.getenv("FILTRO_LIMITE_VARREDURA", "100000"))
+
+# Grandezas físicas derivadas dos planetas
+DERIVADOS_LOTE = int(os.getenv("DERIVADOS_LOTE", "5000"))
+
+# Vínculo das observações com objetos do catálogo (objeto_id)
+OBJETOS_LOTE = int(os.getenv("OBJETOS_LOTE", "2000"))
+
+# Arquivamento de observações: idade em dias a partir da qual são movidas para
+# a coleção de arquivo (0 = desativado), tamanho dos lotes e intervalo entre execuções
+ARQUIVO_DIAS = int(os.getenv("ARQUIVO_DIAS", "0"))
+ARQUIVO_LOTE = int(os.getenv("ARQUIVO_LOTE", "5000"))
+ARQUIVO_INTERVALO_SECONDS = int(os.getenv("ARQUIVO_INTERVALO_SECONDS", "86400"))
+# Maior `skip` aceito em consultas ordenadas que juntam as duas coleções
+ARQUIVO_SKIP_MAXIMO = int(os.getenv("ARQUIVO_SKIP_MAXIMO", "10000"))
+
+# Carga offline de catálogos (carregar_catalogo.py): linhas por lote, processos
+# de leitura e inserções simultâneas
+CARGA_LOTE = int(os.getenv("CARGA_LOTE", "5000"))
+CARGA_PROCESSOS = int(os.getenv("CARGA_PROCESSOS", str(os.cpu_count() or 1)))
+CARGA_ESCRITORES = int(os.getenv("CARGA_ESCRITORES", "4"))
+
+# Índice de estrelas similares (k-NN) em memória: ativação, alterações
+# acumuladas antes de reconstruir a árvore e intervalo de releitura quando o
+# MongoDB não oferece change streams
+SIMILARES = os.getenv("SIMILARES", "1") == "1"
+SIMILARES_DELTA_MAXIMO = int(os.getenv("SIMILARES_DELTA_MAXIMO", "5000"))
+SIMILARES_RECARGA_SECONDS = int(os.getenv("SIMILARES_RECARGA_SECONDS", "300"))
+
+# Gravação em grupo dos POSTs de criação: ativação, intervalo máximo e tamanho
+# máximo de cada lote, e write concern das gravações (w e journal)
+GRUPO_COMMIT = os.getenv("GRUPO_COMMIT", "0") == "1"
+GRUPO_COMMIT_INTERVALO_MS = int(os.getenv("GRUPO_COMMIT_INTERVALO_MS", "5"))
+GRUPO_COMMIT_MAXIMO = int(os.getenv("GRUPO_COMMIT_MAXIMO", "500"))
+GRUPO_COMMIT_W = os.getenv("GRUPO_COMMIT_W", "majority")
+GRUPO_COMMIT_J = os.getenv("GRUPO_COMMIT_J", "1") == "1"
@@ -1,11 +1,26 @@
 from fastapi import FastAPI, HTTPException
+from pymongo.errors import PyMongoError
 import config.database 
 from routes import app as routes_app
+from services.admissao import AdmissaoMiddleware, tratar_erro_mongo
+from services.arquivo import iniciar_arquivamento
+from services.negociacao import NegociacaoMiddleware, RespostaNegociada
+from services.similares import iniciar_similares
+from services.snapshot_colunar import iniciar_snapshots
 
-app = FastAPI()
+app = FastAPI(default_response_class=RespostaNegociada)
+app.add_middleware(NegociacaoMiddleware)
+app.add_middleware(AdmissaoMiddleware)
+app.add_exception_handler(PyMongoError, tratar_erro_mongo)
 
 app.include_router(routes_app)
 
+@app.on_event("startup")
+async def startup():
+    iniciar_snapshots()
+    iniciar_arquivamento()
+    iniciar_similares()
+
 @app.get("/")
 async def root():
     try:
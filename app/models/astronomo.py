@@ -5,4 +5,8 @@ class Astronomo(Document):
     area_estudo = StringField()
     data_nascimento = DateTimeField()
 
-    observacoes = ListField(ReferenceField('Observacao'))  # Relacionamento 1:N
\ No newline at end of file
+    observacoes = ListField(ReferenceField('Observacao'))  # Relacionamento 1:N
+
+    # Índices: referências (limpeza ao excluir documentos relacionados) e
+    # campos ordenáveis nos filtros
+    meta = {"indexes": ["observacoes", "nome", "area_estudo", "data_nascimento"]}
@@ -10,4 +10,8 @@ class Estrela(Document):
     idade = FloatField()
 
     planetas = ListField(ReferenceField('Planeta'))  # Relacionamento 1:N
-    exoplanetas = ListField(ReferenceField('Exoplaneta'))  # Relacionamento 1:N
\ No newline at end of file
+    exoplanetas = ListField(ReferenceField('Exoplaneta'))  # Relacionamento 1:N
+
+    # Índices: referências (limpeza ao excluir documentos relacionados) e
+    # campos ordenáveis nos filtros
+    meta = {"indexes": ["planetas", "exoplanetas", "nome", "magnitude", "distancia", "luminosidade", "temperatura"]}
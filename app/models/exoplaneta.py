@@ -5,4 +5,8 @@ class Exoplaneta(Document):
     nome = StringField(required=True)
 
     estrela = ReferenceField('Estrela')  # Relacionamento N:1
-    planetas = ListField(ReferenceField('Planeta'))  # Relacionamento N:N
\ No newline at end of file
+    planetas = ListField(ReferenceField('Planeta'))  # Relacionamento N:N
+
+    # Índices: referências (limpeza ao excluir documentos relacionados) e
+    # campos ordenáveis nos filtros
+    meta = {"indexes": ["estrela", "planetas", "nome"]}
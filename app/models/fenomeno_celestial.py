@@ -5,4 +5,8 @@ class FenomenoCelestial(Document):
     tipo = StringField()
     descricao = StringField()
 
-    observacoes = ListField(ReferenceField('Observacao'))  # Relacionamento N:N
\ No newline at end of file
+    observacoes = ListField(ReferenceField('Observacao'))  # Relacionamento N:N
+
+    # Índices: referências (limpeza ao excluir documentos relacionados) e
+    # campos ordenáveis nos filtros
+    meta = {"indexes": ["observacoes", "nome", "tipo"]}
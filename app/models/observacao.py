@@ -1,6 +1,6 @@
-from mongoengine import Document, StringField, DateTimeField, ReferenceField, ListField
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, ListField, ObjectIdField
 
-class Observacao(Document):
+class _CamposObservacao(Document):
     datahora = DateTimeField(required=True)
     objeto_id = StringField()
     observador = StringField()
@@ -9,4 +9,31 @@ class Observacao(Document):
 
     telescopio = ReferenceField('Telescopio')  # Relacionamento 1:N
     astronomo = ReferenceField('Astronomo')   # Relacionamento 1:N
-    fenomenos = ListField(ReferenceField('FenomenoCelestial'))  # Relacionamento N:N
\ No newline at end of file
+    fenomenos = ListField(ReferenceField('FenomenoCelestial'))  # Relacionamento N:N
+
+    # Objeto do catálogo indicado em `objeto_id` (services/objetos.py):
+    # coleção ("estrela", "planeta" ou "exoplaneta") e id do documento
+    objeto_tipo = StringField()
+    objeto_ref = ObjectIdField()
+
+    meta = {"abstract": True}
+
+class Observacao(_CamposObservacao):
+    # Índices: referências (limpeza ao excluir documentos relacionados),
+    # campos ordenáveis nos filtros e observações por objeto do catálogo
+    meta = {"indexes": [
+        "telescopio", "astronomo", "fenomenos", "datahora", "observador",
+        ("objeto_tipo", "objeto_ref", "datahora"),
+        "objeto_ref",
+    ]}
+
+class ObservacaoArquivada(_CamposObservacao):
+    """Observações antigas movidas pelo arquivamento (services/arquivo.py).
+
+    A coleção é criada com compressão zstd e tem só os índices usados pelas
+    consultas que chegam ao arquivo (filtros e ordenação de observações).
+    """
+    meta = {
+        "collection": "observacao_arquivo",
+        "indexes": ["datahora", "observador"],
+    }
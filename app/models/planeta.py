@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, FloatField, DateTimeField, ReferenceField, ListField
+from mongoengine import Document, StringField, FloatField, DateTimeField, ReferenceField, ListField, BooleanField
 
 class Planeta(Document):
     nome = StringField(required=True)
@@ -11,4 +11,20 @@ class Planeta(Document):
     data_descoberta = DateTimeField()
 
     estrela = ReferenceField('Estrela')  # Relacionamento 1:N
-    exoplanetas = ListField(ReferenceField('Exoplaneta'))  # Relacionamento N:N
\ No newline at end of file
+    exoplanetas = ListField(ReferenceField('Exoplaneta'))  # Relacionamento N:N
+
+    # Calculados a partir do planeta e da estrela (services/fisica.py)
+    temperatura_equilibrio = FloatField()
+    densidade = FloatField()
+    gravidade_superficial = FloatField()
+    fluxo_estelar = FloatField()
+    zona_habitavel = BooleanField()
+
+    # Índices: referências (limpeza ao excluir documentos relacionados),
+    # campos ordenáveis nos filtros e consultas de habitabilidade
+    meta = {"indexes": [
+        "estrela", "exoplanetas",
+        "nome", "periodo_orbital", "distancia_da_estrela", "raio", "massa", "data_descoberta",
+        "temperatura_equilibrio", "densidade", "gravidade_superficial", "fluxo_estelar",
+        ("zona_habitavel", "temperatura_equilibrio"),
+    ]}
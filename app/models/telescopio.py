@@ -8,3 +8,7 @@ class Telescopio(Document):
     data_lancamento = DateTimeField()
 
     observacao = ReferenceField('Observacao')  # Relacionamento 1:1
+
+    # Índices: referências (limpeza ao excluir documentos relacionados) e
+    # campos ordenáveis nos filtros
+    meta = {"indexes": ["observacao", "nome", "diametro", "data_lancamento"]}
@@ -1,9 +1,23 @@
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header
 from models.astronomo import Astronomo
+from models.observacao import Observacao
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.single_flight import coalescer
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("astronomos")
+
+FILTRO = EspecificacaoFiltro(
+    Astronomo,
+    texto=["nome", "area_estudo"],
+    ordenaveis=["nome", "area_estudo", "data_nascimento"],
+)
 
 def convert_objectid(doc):
     if doc and "_id" in doc:
@@ -20,76 +34,90 @@ async def create_astronomo(data: dict):
                 raise HTTPException(status_code=400, detail="Formato de data inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
 
         astronomo = Astronomo(**data)
-        astronomo.save()
+        await gravar(astronomo)
 
         astronomo_dict = convert_objectid(astronomo.to_mongo().to_dict())
 
-        return {"message": "Astrônomo criado com sucesso", "data": astronomo_dict}
+        return {"message": "Astrônomo criado com sucesso", "data": astronomo_dict, "token_consistencia": gerar_token_consistencia()}
     
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=dict)
-async def get_all_astronomo(
+@coalescer
+def get_all_astronomo(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    total = Astronomo.objects.count()  
-    astronomos = Astronomo.objects.skip(skip).limit(limit)  
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    total = Astronomo.objects.read_preference(preferencia).count()  
+    astronomos = Astronomo.objects.read_preference(preferencia).skip(skip).limit(limit)  
     data = [convert_objectid(astronomo.to_mongo().to_dict()) for astronomo in astronomos]
     return {"quantidade": total, "count": len(data), "astronomos": data}
 
 @router.get("/{astronomo_id}", response_model=dict)
-async def get_astronomo_by_id(astronomo_id: str):
+@coalescer
+def get_astronomo_by_id(
+    astronomo_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(astronomo_id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    astronomo = Astronomo.objects(id=astronomo_id).first()
+    astronomo = Astronomo.objects(id=astronomo_id).read_preference(preferencia).first()
     if not astronomo:
         raise HTTPException(status_code=404, detail="Astrônomo não encontrado")
     
     return convert_objectid(astronomo.to_mongo().to_dict())
 
 @router.get("/filtrar/{astronomo_id}", response_model=dict)
-async def get_astronomo_by(
+@coalescer
+def get_astronomo_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
     nome: str = Query(None, description="Filtrar por nome"),
     area_estudo: str = Query(None, description="Filtrar por área de estudo"),
     ordenacao: str = Query(None, description="Ordenar por campo (ex: nome, area_estudo)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    query = {}
-    if nome:
-        query["nome"] = {"$regex": nome, "$options": "i"}  # Busca por texto parcial (case-insensitive)
-    if area_estudo:
-        query["area_estudo"] = {"$regex": area_estudo, "$options": "i"}
-
-    total = Astronomo.objects(**query).count()
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    consulta = FILTRO.compilar(ordenacao, ordem_ascendente, nome=nome, area_estudo=area_estudo)
 
-    # Ordenação
-    if ordenacao:
-        sinal = "" if ordem_ascendente else "-" 
-        astronomos = Astronomo.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
-    else:  
-        astronomos = Astronomo.objects(**query).skip(skip).limit(limit)
+    total = consulta.queryset(preferencia).count()
+    astronomos = consulta.queryset(preferencia).skip(skip).limit(limit)
 
     data = [convert_objectid(astronomo.to_mongo().to_dict()) for astronomo in astronomos]
     return {"quantidade": total, "count": len(data), "astronomos": data}
+
 @router.get("/{astronomo_id}/observacoes", response_model=dict)
-async def get_observacoes_by_astronomo(astronomo_id: str):
+@coalescer
+def get_observacoes_by_astronomo(
+    astronomo_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(astronomo_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    observacoes = Observacao.objects(astronomo=astronomo_id)
+    observacoes = Observacao.objects(astronomo=astronomo_id).read_preference(preferencia)
     data = [convert_objectid(observacao.to_mongo().to_dict()) for observacao in observacoes]
     return {"count": len(data), "observacoes": data}
 
     
 @router.get("{astronomo_id}/consulta_observacao", response_model=dict)
-async def get_in_observacao(content: str):
+@coalescer
+def get_in_observacao(
+    content: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
 
-    astronomos = Astronomo.objects(observacoes__propriedades_observadas__icontains=content)
+    astronomos = Astronomo.objects(observacoes__propriedades_observadas__icontains=content).read_preference(preferencia)
 
     data = [convert_objectid(astronomo.to_mongo().to_dict()) for astronomo in astronomos]
     return {"count": len(data), "astronomos": data}
@@ -106,7 +134,7 @@ async def update_astronomo(astronomo_id: str, data: dict):
     
     astronomo.update(**data)
     astronomo.reload()
-    return {"message": "Astrônomo atualizado com sucesso", "data": convert_objectid(astronomo.to_mongo().to_dict())}
+    return {"message": "Astrônomo atualizado com sucesso", "data": convert_objectid(astronomo.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
 
 @router.delete("/{astronomo_id}", response_model=dict)
 async def delete_astronomo(astronomo_id: str):
@@ -117,5 +145,5 @@ async def delete_astronomo(astronomo_id: str):
     if not astronomo:
         raise HTTPException(status_code=404, detail="Astrônomo não encontrado")
     
-    astronomo.delete()
-    return {"message": "Astrônomo excluído com sucesso"}
+    tarefa = excluir(astronomo)
+    return {"message": "Astrônomo excluído com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
@@ -0,0 +1,117 @@
+import asyncio
+import base64
+import json
+from fastapi import APIRouter, HTTPException, Request
+from config import settings
+
+router = APIRouter()
+
+async def executar_subrequisicao(app, escopo_pai, subrequisicao, semaforo):
+    """Executa uma sub-requisição diretamente na aplicação ASGI, sem passar pela rede."""
+    metodo = subrequisicao.get("method", "GET").upper()
+    caminho, _, query_string = subrequisicao["path"].partition("?")
+    corpo = b""
+    if subrequisicao.get("body") is not None:
+        corpo = json.dumps(subrequisicao["body"]).encode()
+
+    headers = [(chave.lower().encode(), str(valor).encode()) for chave, valor in subrequisicao.get("headers", {}).items()]
+    headers.append((b"content-length", str(len(corpo)).encode()))
+    if corpo:
+        headers.append((b"content-type", b"application/json"))
+
+    escopo = {
+        "type": "http",
+        "asgi": escopo_pai.get("asgi", {"version": "3.0"}),
+        "http_version": escopo_pai.get("http_version", "1.1"),
+        "method": metodo,
+        "scheme": escopo_pai.get("scheme", "http"),
+        "path": caminho,
+        "raw_path": caminho.encode(),
+        "query_string": query_string.encode(),
+        "root_path": escopo_pai.get("root_path", ""),
+        "headers": headers,
+        "client": escopo_pai.get("client"),
+        "server": escopo_pai.get("server"),
+    }
+
+    concluida = asyncio.Event()
+    corpo_enviado = False
+    resposta = {"status": 500, "headers": {}, "partes": []}
+
+    async def receive():
+        nonlocal corpo_enviado
+        if not corpo_enviado:
+            corpo_enviado = True
+            return {"type": "http.request", "body": corpo, "more_body": False}
+        await concluida.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resposta["status"] = mensagem["status"]
+            resposta["headers"] = {chave.decode(): valor.decode() for chave, valor in mensagem.get("headers", [])}
+        elif mensagem["type"] == "http.response.body":
+            resposta["partes"].append(mensagem.get("body", b""))
+
+    async with semaforo:
+        try:
+            await app(escopo, receive, send)
+        except Exception as e:
+            # O ServerErrorMiddleware responde 500 e repassa a exceção; ela
+            # vale só para esta sub-requisição, não para o batch inteiro
+            return {"id": subrequisicao.get("id"), "status": 500, "body": {"detail": str(e)}}
+        finally:
+            concluida.set()
+
+    conteudo = b"".join(resposta["partes"])
+    tipo = resposta["headers"].get("content-type", "")
+    resultado = {"id": subrequisicao.get("id"), "status": resposta["status"]}
+    if tipo.startswith("application/json"):
+        resultado["body"] = json.loads(conteudo) if conteudo else None
+        return resultado
+    if tipo.startswith("text/"):
+        try:
+            resultado["body"] = conteudo.decode()
+            return resultado
+        except UnicodeDecodeError:
+            pass
+    # Respostas binárias (Arrow, Parquet, BSON, MessagePack...) vão em base64
+    resultado["body"] = base64.b64encode(conteudo).decode()
+    resultado["codificacao"] = "base64"
+    resultado["content_type"] = tipo
+    return resultado
+
+@router.post("/", response_model=dict)
+async def executar_batch(request: Request, data: dict):
+    requisicoes = data.get("requisicoes")
+    if not isinstance(requisicoes, list) or not requisicoes:
+        raise HTTPException(status_code=400, detail="Informe a lista 'requisicoes'.")
+    if len(requisicoes) > settings.BATCH_MAX_REQUISICOES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {settings.BATCH_MAX_REQUISICOES} requisições por batch.")
+    for subrequisicao in requisicoes:
+        if not isinstance(subrequisicao, dict) or not str(subrequisicao.get("path", "")).startswith("/"):
+            raise HTTPException(status_code=400, detail="Cada requisição precisa de um 'path' começando com '/'.")
+        if subrequisicao["path"].startswith("/batch"):
+            raise HTTPException(status_code=400, detail="Batches aninhados não são permitidos.")
+        caminho = subrequisicao["path"].partition("?")[0].rstrip("/")
+        if caminho.endswith("/stream") or caminho.endswith("/ws"):
+            raise HTTPException(status_code=400, detail="Feeds em tempo real (/stream, /ws) não podem ser usados em batch.")
+
+    # GETs consecutivos rodam em paralelo; escritas rodam sozinhas, na ordem
+    # em que aparecem, para que leituras posteriores vejam seus efeitos.
+    etapas = []
+    for subrequisicao in requisicoes:
+        leitura = subrequisicao.get("method", "GET").upper() == "GET"
+        if leitura and etapas and etapas[-1][0]:
+            etapas[-1][1].append(subrequisicao)
+        else:
+            etapas.append((leitura, [subrequisicao]))
+
+    semaforo = asyncio.Semaphore(settings.BATCH_CONCORRENCIA)
+    respostas = []
+    for _, subrequisicoes in etapas:
+        respostas.extend(await asyncio.gather(*[
+            executar_subrequisicao(request.app, request.scope, subrequisicao, semaforo)
+            for subrequisicao in subrequisicoes
+        ]))
+    return {"count": len(respostas), "respostas": respostas}
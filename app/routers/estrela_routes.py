@@ -1,8 +1,31 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header
+from config import settings
 from models.estrela import Estrela
+from models.planeta import Planeta
+from models.exoplaneta import Exoplaneta
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.objetos import observacoes_do_objeto
+from services.fisica import recalcular_planetas
+from services.export_colunar import FORMATOS as FORMATOS_EXPORT, exportar
+from services.similares import indice_similares
+from services.single_flight import coalescer
+from services.snapshot_colunar import snapshot_para
+from services.tarefas import fila_tarefas
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("estrelas")
+
+FILTRO = EspecificacaoFiltro(
+    Estrela,
+    texto=["nome", "tipo_espectral"],
+    intervalos=["magnitude"],
+    ordenaveis=["nome", "magnitude", "distancia", "luminosidade", "temperatura"],
+)
 
 def convert_objectid(doc):
     if doc and "_id" in doc:
@@ -13,35 +36,60 @@ def convert_objectid(doc):
 async def create_estrela(data: dict):
     try:
         estrela = Estrela(**data)
-        estrela.save()
-        return {"message": "Estrela criada com sucesso", "data": convert_objectid(estrela.to_mongo().to_dict())}
+        await gravar(estrela)
+        resposta = {"message": "Estrela criada com sucesso", "data": convert_objectid(estrela.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
+
+        # Planetas já gravados com referência a esta estrela (ex.: carga com ids
+        # definidos) ganham as grandezas derivadas que dependem dela
+        if "luminosidade" in data or "temperatura" in data:
+            tarefa = fila_tarefas.enfileirar("derivados_planetas", recalcular_planetas, {"estrela": estrela.id})
+            resposta["tarefa_derivados"] = tarefa.id
+        return resposta
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 #Gets
 @router.get("/", response_model=dict)
-async def get_all_estrelas(
+@coalescer
+def get_all_estrelas(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    total = Estrela.objects.count()
-    estrelas = Estrela.objects.skip(skip).limit(limit)
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    total = Estrela.objects.read_preference(preferencia).count()
+    estrelas = Estrela.objects.read_preference(preferencia).skip(skip).limit(limit)
     data = [convert_objectid(estrela.to_mongo().to_dict()) for estrela in estrelas]
     return {"total": total, "count": len(data), "estrelas": data}
 
+@router.get("/export.{formato}")
+async def export_estrelas(formato: str):
+    if formato not in FORMATOS_EXPORT:
+        raise HTTPException(status_code=404, detail="Formato de exportação inválido. Use 'arrow' ou 'parquet'.")
+
+    return exportar(Estrela, formato, "estrelas", LEITURA)
+
 @router.get("/{estrela_id}", response_model=dict)
-async def get_estrela_by_id(estrela_id: str):
+@coalescer
+def get_estrela_by_id(
+    estrela_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(estrela_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    estrela = Estrela.objects(id=estrela_id).first()
+    estrela = Estrela.objects(id=estrela_id).read_preference(preferencia).first()
     if not estrela:
         raise HTTPException(status_code=404, detail="Estrela não encontrada")
 
     return {"data": convert_objectid(estrela.to_mongo().to_dict())}
 
 @router.get("/{estrela_id}/filtrar", response_model=dict)
-async def get_estrelas_by(
+@coalescer
+def get_estrelas_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
     nome: str = Query(None, description="Filtrar por nome"),
@@ -50,57 +98,120 @@ async def get_estrelas_by(
     magnitude_max: float = Query(None, description="Filtrar por magnitude (máximo)"),
     ordenacao: str = Query(None, description="Ordenar por campo (ex: nome, magnitude)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    query = {}
-    if nome:
-        query["nome"] = {"$regex": nome, "$options": "i"}  # Busca por texto parcial (case-insensitive)
-    if tipo_espectral:
-        query["tipo_espectral"] = {"$regex": tipo_espectral, "$options": "i"}
-    if magnitude_min is not None:
-        query["magnitude__gte"] = magnitude_min  # Maior ou igual que
-    if magnitude_max is not None:
-        query["magnitude__lte"] = magnitude_max  # Menor ou igual que
-
-    total = Estrela.objects(**query).count()
-
-    # Ordenação
-    if ordenacao:
-        sinal = "" if ordem_ascendente else "-"  # "-" para ordem descendente
-        estrelas = Estrela.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
-    else:  # Ordenação padrão (se nenhum campo for especificado)
-      estrelas = Estrela.objects(**query).skip(skip).limit(limit)
-
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    consulta = FILTRO.compilar(
+        ordenacao, ordem_ascendente, verificar=False,
+        nome=nome, tipo_espectral=tipo_espectral, magnitude_min=magnitude_min, magnitude_max=magnitude_max,
+    )
+
+    snapshot = snapshot_para(Estrela)
+    # Filtros só numéricos são resolvidos no snapshot em memória; quem acabou
+    # de escrever (token de consistência) continua lendo do MongoDB.
+    if snapshot and not (consulta.textos or x_token_consistencia) and snapshot.suporta(consulta.intervalos, ordenacao):
+        total, ids = snapshot.filtrar(consulta.intervalos, ordenacao, ordem_ascendente, skip, limit)
+        estrelas = snapshot.buscar(ids)
+    else:
+        FILTRO.verificar(consulta)
+        total = consulta.queryset(preferencia).count()
+        estrelas = consulta.queryset(preferencia).skip(skip).limit(limit)
 
     data = [convert_objectid(estrela.to_mongo().to_dict()) for estrela in estrelas]
     return {"total": total, "count": len(data), "estrelas": data}
 
 @router.get("/{estrela_id}/planetas", response_model=dict)
-async def get_planetas_by_estrela(estrela_id: str):
+@coalescer
+def get_planetas_by_estrela(
+    estrela_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(estrela_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    planetas = Planeta.objects(estrela=estrela_id)
+    planetas = Planeta.objects(estrela=estrela_id).read_preference(preferencia)
     data = [convert_objectid(planeta.to_mongo().to_dict()) for planeta in planetas]
     return {"count": len(data), "planetas": data}
 
 @router.get("/{estrela_id}/exoplanetas", response_model=dict)
-async def get_exoplanetas_by_estrela(estrela_id: str):
+@coalescer
+def get_exoplanetas_by_estrela(
+    estrela_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(estrela_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    exoplanetas = Exoplaneta.objects(estrela=estrela_id)
+    exoplanetas = Exoplaneta.objects(estrela=estrela_id).read_preference(preferencia)
     data = [convert_objectid(exoplaneta.to_mongo().to_dict()) for exoplaneta in exoplanetas]
     return {"count": len(data), "exoplanetas": data}
 
+@router.get("/{estrela_id}/observacoes", response_model=dict)
+@coalescer
+def get_observacoes_by_estrela(
+    estrela_id: str,
+    skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    if not ObjectId.is_valid(estrela_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+
+    observacoes = observacoes_do_objeto("estrela", estrela_id, preferencia)
+    total = observacoes.count()
+    data = [convert_objectid(observacao.to_mongo().to_dict()) for observacao in observacoes.skip(skip).limit(limit)]
+    return {"total": total, "count": len(data), "observacoes": data}
+
+@router.get("/{estrela_id}/similares", response_model=dict)
+@coalescer
+def get_estrelas_similares(
+    estrela_id: str,
+    k: int = Query(10, gt=0, le=100, description="Número de estrelas similares"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    if not ObjectId.is_valid(estrela_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    if not settings.SIMILARES:
+        raise HTTPException(status_code=501, detail="Busca de estrelas similares desativada (SIMILARES=0).")
+    if not indice_similares.pronto:
+        raise HTTPException(status_code=503, detail="Índice de estrelas similares em construção.", headers={"Retry-After": "5"})
+
+    vizinhos = indice_similares.vizinhos(estrela_id, k)
+    if vizinhos is None:
+        raise HTTPException(status_code=404, detail="Estrela não encontrada")
+
+    estrelas = {estrela.id: estrela for estrela in Estrela.objects(id__in=[id_ for id_, _ in vizinhos]).read_preference(preferencia)}
+    data = []
+    for id_, distancia in vizinhos:
+        if id_ in estrelas:
+            estrela = convert_objectid(estrelas[id_].to_mongo().to_dict())
+            estrela["distancia_similaridade"] = distancia
+            data.append(estrela)
+    return {"count": len(data), "similares": data}
+
 @router.get("/{estrela_id}/consulta_planeta", response_model=dict)
-async def get_in_planeta(tipo_planeta: str = Query(None, description="Tipo de planeta")):
-    estrelas = Estrela.objects(planetas__tipo=tipo_planeta)
+@coalescer
+def get_in_planeta(
+    tipo_planeta: str = Query(None, description="Tipo de planeta"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    estrelas = Estrela.objects(planetas__tipo=tipo_planeta).read_preference(preferencia)
     data = [convert_objectid(estrela.to_mongo().to_dict()) for estrela in estrelas]
     return {"count": len(data), "estrelas": data}
 
 @router.get("/{estrela_id}/consulta_exoplaneta", response_model=dict)
-async def get_in_exoplaneta(nome_exoplaneta: str = Query(None, description="Nome do exoplaneta")):
-    estrelas = Estrela.objects(exoplanetas__nome=nome_exoplaneta)
+@coalescer
+def get_in_exoplaneta(
+    nome_exoplaneta: str = Query(None, description="Nome do exoplaneta"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    estrelas = Estrela.objects(exoplanetas__nome=nome_exoplaneta).read_preference(preferencia)
     data = [convert_objectid(estrela.to_mongo().to_dict()) for estrela in estrelas]
     return {"count": len(data), "estrelas": data}
 
@@ -115,7 +226,13 @@ async def update_estrela(estrela_id: str, data: dict):
 
     estrela.update(**data)
     estrela.reload()
-    return {"message": "Estrela atualizada com sucesso", "data": convert_objectid(estrela.to_mongo().to_dict())}
+    resposta = {"message": "Estrela atualizada com sucesso", "data": convert_objectid(estrela.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
+
+    # Luminosidade e temperatura entram nas grandezas derivadas dos planetas da estrela
+    if "luminosidade" in data or "temperatura" in data:
+        tarefa = fila_tarefas.enfileirar("derivados_planetas", recalcular_planetas, {"estrela": estrela.id})
+        resposta["tarefa_derivados"] = tarefa.id
+    return resposta
 
 @router.delete("/{estrela_id}", response_model=dict)
 async def delete_estrela(estrela_id: str):
@@ -126,5 +243,5 @@ async def delete_estrela(estrela_id: str):
     if not estrela:
         raise HTTPException(status_code=404, detail="Estrela não encontrada")
 
-    estrela.delete()
-    return {"message": "Estrela deletada com sucesso"}
+    tarefa = excluir(estrela)
+    return {"message": "Estrela deletada com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
@@ -1,9 +1,19 @@
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header
 from models.exoplaneta import Exoplaneta
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.objetos import observacoes_do_objeto
+from services.single_flight import coalescer
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("exoplanetas")
+
+FILTRO = EspecificacaoFiltro(Exoplaneta, texto=["nome"], ordenaveis=["nome"])
 
 def convert_objectid(doc):
     
@@ -33,69 +43,99 @@ async def create_exoplaneta(data: dict):
                 raise HTTPException(status_code=400, detail="ID de planeta inválido.")
         
         exoplaneta = Exoplaneta(**data)
-        exoplaneta.save()
+        await gravar(exoplaneta)
         
         response_data = convert_objectid(exoplaneta.to_mongo().to_dict())
-        return {"message": "Exoplaneta criado com sucesso", "data": response_data}
+        return {"message": "Exoplaneta criado com sucesso", "data": response_data, "token_consistencia": gerar_token_consistencia()}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=dict)
-async def get_all_exoplanetas(
+@coalescer
+def get_all_exoplanetas(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
    
     try:
-        total = Exoplaneta.objects.count()
-        exoplanetas = Exoplaneta.objects.skip(skip).limit(limit)
+        total = Exoplaneta.objects.read_preference(preferencia).count()
+        exoplanetas = Exoplaneta.objects.read_preference(preferencia).skip(skip).limit(limit)
         data = [convert_objectid(exoplaneta.to_mongo().to_dict()) for exoplaneta in exoplanetas]
         return {"total": total, "count": len(data), "exoplanetas": data}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{exoplaneta_id}", response_model=dict)
-async def get_exoplaneta_by_id(exoplaneta_id: str):
+@coalescer
+def get_exoplaneta_by_id(
+    exoplaneta_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     
     try:
         if not ObjectId.is_valid(exoplaneta_id):
             raise HTTPException(status_code=400, detail="ID inválido")
 
-        exoplaneta = Exoplaneta.objects(id=exoplaneta_id).first()
+        exoplaneta = Exoplaneta.objects(id=exoplaneta_id).read_preference(preferencia).first()
         if not exoplaneta:
             raise HTTPException(status_code=404, detail="Exoplaneta não encontrado")
 
         return {"data": convert_objectid(exoplaneta.to_mongo().to_dict())}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{exoplaneta_id}/filtrar", response_model=dict)
-async def get_exoplanetas_by(
+@coalescer
+def get_exoplanetas_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
     nome: str = Query(None, description="Filtrar por nome"),
     ordenacao: str = Query(None, description="Ordenar por campo (ex: nome)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
-        query = {}
-        if nome:
-            query["nome"] = {"$regex": nome, "$options": "i"}
+        consulta = FILTRO.compilar(ordenacao, ordem_ascendente, nome=nome)
 
-        total = Exoplaneta.objects(**query).count()
-
-        if ordenacao:
-            sinal = "" if ordem_ascendente else "-"
-            exoplanetas = Exoplaneta.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
-        else:
-            exoplanetas = Exoplaneta.objects(**query).skip(skip).limit(limit)
+        total = consulta.queryset(preferencia).count()
+        exoplanetas = consulta.queryset(preferencia).skip(skip).limit(limit)
 
         data = [convert_objectid(exoplaneta.to_mongo().to_dict()) for exoplaneta in exoplanetas]
         return {"total": total, "count": len(data), "exoplanetas": data}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{exoplaneta_id}/observacoes", response_model=dict)
+@coalescer
+def get_observacoes_by_exoplaneta(
+    exoplaneta_id: str,
+    skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    if not ObjectId.is_valid(exoplaneta_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+
+    observacoes = observacoes_do_objeto("exoplaneta", exoplaneta_id, preferencia)
+    total = observacoes.count()
+    data = [convert_objectid(observacao.to_mongo().to_dict()) for observacao in observacoes.skip(skip).limit(limit)]
+    return {"total": total, "count": len(data), "observacoes": data}
+
+
 @router.put("/{exoplaneta_id}", response_model=dict)
 async def update_exoplaneta(exoplaneta_id: str, data: dict):
    
@@ -110,7 +150,9 @@ async def update_exoplaneta(exoplaneta_id: str, data: dict):
         # Atualiza os campos fornecidos
         exoplaneta.update(**data)
         exoplaneta.reload()
-        return {"message": "Exoplaneta atualizado com sucesso", "data": convert_objectid(exoplaneta.to_mongo().to_dict())}
+        return {"message": "Exoplaneta atualizado com sucesso", "data": convert_objectid(exoplaneta.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -125,7 +167,9 @@ async def delete_exoplaneta(exoplaneta_id: str):
         if not exoplaneta:
             raise HTTPException(status_code=404, detail="Exoplaneta não encontrado")
 
-        exoplaneta.delete()
-        return {"message": "Exoplaneta deletado com sucesso"}
+        tarefa = excluir(exoplaneta)
+        return {"message": "Exoplaneta deletado com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
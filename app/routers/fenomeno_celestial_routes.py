@@ -1,8 +1,21 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header
 from models.fenomeno_celestial import FenomenoCelestial
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.single_flight import coalescer
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("fenomenos")
+
+FILTRO = EspecificacaoFiltro(
+    FenomenoCelestial,
+    texto=["nome", "tipo", "descricao"],
+    ordenaveis=["nome", "tipo"],
+)
 
 def convert_objectid(doc):
     if doc and "_id" in doc:
@@ -13,34 +26,45 @@ def convert_objectid(doc):
 async def create_fenomeno_celestial(data: dict):
     try:
         fenomeno = FenomenoCelestial(**data)
-        fenomeno.save()
-        return {"message": "Fenômeno celestial criado com sucesso", "data": convert_objectid(fenomeno.to_mongo().to_dict())}
+        await gravar(fenomeno)
+        return {"message": "Fenômeno celestial criado com sucesso", "data": convert_objectid(fenomeno.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=dict)
-async def get_all_fenomenos_celestiais(
+@coalescer
+def get_all_fenomenos_celestiais(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    total = FenomenoCelestial.objects.count()
-    fenomenos = FenomenoCelestial.objects.skip(skip).limit(limit)
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    total = FenomenoCelestial.objects.read_preference(preferencia).count()
+    fenomenos = FenomenoCelestial.objects.read_preference(preferencia).skip(skip).limit(limit)
     data = [convert_objectid(fenomeno.to_mongo().to_dict()) for fenomeno in fenomenos]
     return {"total": total, "count": len(data), "fenomenos_celestiais": data}
 
 @router.get("/{fenomeno_id}", response_model=dict)
-async def get_fenomeno_celestial_by_id(fenomeno_id: str):
+@coalescer
+def get_fenomeno_celestial_by_id(
+    fenomeno_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(fenomeno_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    fenomeno = FenomenoCelestial.objects(id=fenomeno_id).first()
+    fenomeno = FenomenoCelestial.objects(id=fenomeno_id).read_preference(preferencia).first()
     if not fenomeno:
         raise HTTPException(status_code=404, detail="Fenômeno celestial não encontrado")
 
     return {"data": convert_objectid(fenomeno.to_mongo().to_dict())}
 
 @router.get("/{fenomeno_id}/filtrar", response_model=dict)
-async def get_all_fenomenos_celestiais(
+@coalescer
+def get_fenomenos_celestiais_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
     nome: str = Query(None, description="Filtrar por nome"),
@@ -48,26 +72,19 @@ async def get_all_fenomenos_celestiais(
     descricao: str = Query(None, description="Filtrar por descrição"),
     ordenacao: str = Query(None, description="Ordenar por campo (ex: nome, tipo)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
-        query = {}
-        if nome:
-            query["nome"] = {"$regex": nome, "$options": "i"}
-        if tipo:
-            query["tipo"] = {"$regex": tipo, "$options": "i"}
-        if descricao:
-            query["descricao"] = {"$regex": descricao, "$options": "i"}
-
-        total = FenomenoCelestial.objects(**query).count()
-
-        if ordenacao:
-            sinal = "" if ordem_ascendente else "-"
-            fenomenos = FenomenoCelestial.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
-        else:
-            fenomenos = FenomenoCelestial.objects(**query).skip(skip).limit(limit)
+        consulta = FILTRO.compilar(ordenacao, ordem_ascendente, nome=nome, tipo=tipo, descricao=descricao)
+
+        total = consulta.queryset(preferencia).count()
+        fenomenos = consulta.queryset(preferencia).skip(skip).limit(limit)
 
         data = [convert_objectid(fenomeno.to_mongo().to_dict()) for fenomeno in fenomenos]
         return {"total": total, "count": len(data), "fenomenos_celestiais": data}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -82,7 +99,7 @@ async def update_fenomeno_celestial(fenomeno_id: str, data: dict):
 
     fenomeno.update(**data)
     fenomeno.reload()
-    return {"message": "Fenômeno celestial atualizado com sucesso", "data": convert_objectid(fenomeno.to_mongo().to_dict())}
+    return {"message": "Fenômeno celestial atualizado com sucesso", "data": convert_objectid(fenomeno.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
 
 @router.delete("/{fenomeno_id}", response_model=dict)
 async def delete_fenomeno_celestial(fenomeno_id: str):
@@ -93,5 +110,5 @@ async def delete_fenomeno_celestial(fenomeno_id: str):
     if not fenomeno:
         raise HTTPException(status_code=404, detail="Fenômeno celestial não encontrado")
 
-    fenomeno.delete()
-    return {"message": "Fenômeno celestial deletado com sucesso"}
+    tarefa = excluir(fenomeno)
+    return {"message": "Fenômeno celestial deletado com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
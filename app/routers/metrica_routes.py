@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from services.admissao import portoes
+from services.grupo_commit import buffers
+from services.similares import indice_similares
+from services.single_flight import single_flight
+from services.snapshot_colunar import snapshots
+
+router = APIRouter()
+
+@router.get("/", response_model=dict)
+async def get_metricas():
+    return {
+        "admissao": {classe: portao.metricas() for classe, portao in portoes.items()},
+        "single_flight": single_flight.metricas(),
+        "snapshot_colunar": {modelo.__name__: snapshot.memoria() for modelo, snapshot in snapshots.items()},
+        "similares": indice_similares.metricas(),
+        "grupo_commit": {modelo.__name__: buffer.metricas() for modelo, buffer in buffers.items()},
+    }
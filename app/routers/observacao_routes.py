@@ -1,9 +1,32 @@
+import asyncio
+import json
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from models.observacao import Observacao
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config import settings
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services import arquivo
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.objetos import resolver_observacoes, vincular
+from services.export_colunar import FORMATOS as FORMATOS_EXPORT, exportar
+from services.single_flight import coalescer
+from services.change_stream import hub_para
+from services.tarefas import fila_tarefas
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("observacoes")
+
+FILTRO = EspecificacaoFiltro(
+    Observacao,
+    texto={"observador": "observador", "localizacao": "localizacao", "propriedades": "propriedades_observadas"},
+    datas=["datahora"],
+    ordenaveis=["datahora", "observador"],
+)
 
 def convert_objectid(doc):
     if isinstance(doc, dict):
@@ -36,36 +59,155 @@ async def create_observacao(data: dict):
         if "fenomenos" in data and isinstance(data["fenomenos"], list):
             data["fenomenos"] = [ObjectId(f) if ObjectId.is_valid(f) else HTTPException(status_code=400, detail="ID de fenômeno inválido.") for f in data["fenomenos"]]
         
-        observacao = Observacao(**data)
-        observacao.save()
-        return {"message": "Observação criada com sucesso", "data": convert_objectid(observacao.to_mongo().to_dict())}
+        # vincular() consulta o catálogo de forma síncrona; fora do loop de eventos
+        observacao = Observacao(**await asyncio.to_thread(vincular, data))
+        await gravar(observacao)
+        return {"message": "Observação criada com sucesso", "data": convert_objectid(observacao.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
     
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=dict)
-async def get_all_observacoes(
+@coalescer
+def get_all_observacoes(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    datahora_inicio: str = Query(None, description="Observações a partir desta data e hora"),
+    datahora_fim: str = Query(None, description="Observações até esta data e hora"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    total = Observacao.objects.count()  
-    observacoes = Observacao.objects.skip(skip).limit(limit)  
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    # O arquivo só entra quando o intervalo pedido alcança as datas arquivadas
+    consulta = FILTRO.compilar(datahora_inicio=datahora_inicio, datahora_fim=datahora_fim)
+    total, observacoes = arquivo.consultar(consulta, preferencia, skip, limit)
     data = [convert_objectid(obs.to_mongo().to_dict()) for obs in observacoes]
     return {"quantidade": total, "count": len(data), "observacoes": data}
 
+def serializar_evento(evento):
+    return json.dumps({
+        "id": evento["id"],
+        "operacao": evento["operacao"],
+        "observacao_id": evento["documento_id"],
+        "data": convert_objectid(dict(evento["documento"])) if evento["documento"] else None,
+    }, default=str)
+
+FEED_SEM_SUPORTE = "Feed em tempo real indisponível: o MongoDB não suporta change streams (é preciso um replica set)."
+
+async def feed_disponivel():
+    """Abre o change stream (numa thread, fora do loop) e informa se o servidor o suporta."""
+    hub = hub_para(Observacao)
+    await asyncio.to_thread(hub.iniciar, True)
+    return hub.suportado
+
+@router.get("/stream")
+async def stream_observacoes(
+    request: Request,
+    telescopio: str = Query(None, description="Filtrar por ID do telescópio"),
+    astronomo: str = Query(None, description="Filtrar por ID do astrônomo"),
+    fenomeno: str = Query(None, description="Filtrar por ID do fenômeno celestial"),
+    last_event_id: str = Header(None, description="Último evento recebido, para retomar após reconexão"),
+):
+    # Sem change stream o cliente só receberia keepalives; 503 indica que deve usar a listagem
+    if not await feed_disponivel():
+        raise HTTPException(status_code=503, detail=FEED_SEM_SUPORTE)
+    filtros = {"telescopio": telescopio, "astronomo": astronomo, "fenomenos": fenomeno}
+    assinatura, completo = hub_para(Observacao).inscrever(filtros, last_event_id, settings.STREAM_BUFFER_CLIENTE)
+
+    async def eventos():
+        try:
+            if not completo:
+                yield "event: reinicio\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(assinatura.fila.get(), timeout=settings.STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {evento['id']}\nevent: observacao\ndata: {serializar_evento(evento)}\n\n"
+        finally:
+            hub_para(Observacao).cancelar(assinatura)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.websocket("/ws")
+async def websocket_observacoes(
+    websocket: WebSocket,
+    telescopio: str = None,
+    astronomo: str = None,
+    fenomeno: str = None,
+    ultimo_id: str = None,
+):
+    await websocket.accept()
+    if not await feed_disponivel():
+        await websocket.send_text(json.dumps({"operacao": "erro", "detail": FEED_SEM_SUPORTE}))
+        await websocket.close(code=1011, reason="change streams não suportados")
+        return
+    filtros = {"telescopio": telescopio, "astronomo": astronomo, "fenomenos": fenomeno}
+    assinatura, completo = hub_para(Observacao).inscrever(filtros, ultimo_id, settings.STREAM_BUFFER_CLIENTE)
+    # Mensagens do cliente são ignoradas; a leitura serve para detectar a desconexão
+    recebimento = asyncio.ensure_future(websocket.receive())
+    try:
+        if not completo:
+            await websocket.send_text(json.dumps({"operacao": "reinicio"}))
+        while True:
+            proximo = asyncio.ensure_future(assinatura.fila.get())
+            await asyncio.wait({proximo, recebimento}, return_when=asyncio.FIRST_COMPLETED)
+            if recebimento.done():
+                if recebimento.result()["type"] == "websocket.disconnect":
+                    proximo.cancel()
+                    break
+                recebimento = asyncio.ensure_future(websocket.receive())
+            if proximo.done():
+                await websocket.send_text(serializar_evento(proximo.result()))
+            else:
+                proximo.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        recebimento.cancel()
+        hub_para(Observacao).cancelar(assinatura)
+
+@router.get("/export.{formato}")
+async def export_observacoes(formato: str):
+    if formato not in FORMATOS_EXPORT:
+        raise HTTPException(status_code=404, detail="Formato de exportação inválido. Use 'arrow' ou 'parquet'.")
+
+    return exportar(Observacao, formato, "observacoes", LEITURA)
+
+@router.post("/objetos/resolver", response_model=dict)
+async def resolver_objetos(todas: bool = Query(False, description="Refazer o vínculo também das observações já vinculadas")):
+    tarefa = fila_tarefas.enfileirar("resolver_objetos", resolver_observacoes, todas)
+    return {"message": "Vínculo das observações com o catálogo agendado", "tarefa": tarefa.id}
+
+@router.post("/arquivo/arquivar", response_model=dict)
+async def arquivar_observacoes(dias: int = Query(None, gt=0, description="Idade mínima, em dias (padrão: ARQUIVO_DIAS)")):
+    if not dias and settings.ARQUIVO_DIAS <= 0:
+        raise HTTPException(status_code=400, detail="Informe 'dias' ou configure ARQUIVO_DIAS.")
+
+    tarefa = fila_tarefas.enfileirar(arquivo.TAREFA_AGENDADA, arquivo.arquivar, dias)
+    return {"message": "Arquivamento de observações agendado", "tarefa": tarefa.id}
+
 @router.get("/{observacao_id}", response_model=dict)
-async def get_observacao_by_id(observacao_id: str):
+@coalescer
+def get_observacao_by_id(
+    observacao_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(observacao_id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    observacao = Observacao.objects(id=observacao_id).first()
+    observacao = arquivo.buscar(observacao_id, preferencia)
     if not observacao:
         raise HTTPException(status_code=404, detail="Observação não encontrada")
     
     return convert_objectid(observacao.to_mongo().to_dict())
 
 @router.get("/{observacao_id}/filtrar", response_model=dict)
-async def get_observacoes_by(
+@coalescer
+def get_observacoes_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
 
@@ -77,47 +219,34 @@ async def get_observacoes_by(
 
     ordenacao: str = Query(None, description="Ordenar por campo (ex: datahora, observador)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
-        query = {}
-        if observador:
-            query["observador"] = {"$regex": observador, "$options": "i"}
-        if localizacao:
-            query["localizacao"] = {"$regex": localizacao, "$options": "i"}
-        if propriedades:
-            query["propriedades_observadas"] = {"$regex": propriedades, "$options": "i"}
-        if datahora_inicio:
-            try:
-                datahora_inicio = datetime.fromisoformat(datahora_inicio)
-                query["datahora__gte"] = datahora_inicio
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de data e hora inicial inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
-        if datahora_fim:
-            try:
-                datahora_fim = datetime.fromisoformat(datahora_fim)
-                query["datahora__lte"] = datahora_fim
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de data e hora final inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
-
-        total = Observacao.objects(**query).count()
+        consulta = FILTRO.compilar(
+            ordenacao, ordem_ascendente,
+            observador=observador, localizacao=localizacao, propriedades=propriedades,
+            datahora_inicio=datahora_inicio, datahora_fim=datahora_fim,
+        )
 
-        if ordenacao:
-            sinal = "" if ordem_ascendente else "-"
-            observacoes = Observacao.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
-        else:
-            observacoes = Observacao.objects(**query).skip(skip).limit(limit)
+        total, observacoes = arquivo.consultar(consulta, preferencia, skip, limit)
 
         data = [convert_objectid(obs.to_mongo().to_dict()) for obs in observacoes]
         return {"quantidade": total, "count": len(data), "observacoes": data}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{observacao_id}/consulta_astronomo", response_model=dict)
-async def get_in_astronomo(
-    nome_astronomo: str = Query(None, description="Nome do astrônomo")
+@coalescer
+def get_in_astronomo(
+    nome_astronomo: str = Query(None, description="Nome do astrônomo"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
-        observacoes = Observacao.objects(astronomo__nome__icontains=nome_astronomo)  # Case-insensitive
+        observacoes = Observacao.objects(astronomo__nome__icontains=nome_astronomo).read_preference(preferencia)  # Case-insensitive
         resultados = []
         for observacao in observacoes:
             resultados.append({
@@ -128,6 +257,8 @@ async def get_in_astronomo(
 
         return {"count": len(resultados), "observacoes": resultados}
 
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -149,9 +280,9 @@ async def update_observacao(observacao_id: str, data: dict):
     if "fenomenos" in data and isinstance(data["fenomenos"], list):
         data["fenomenos"] = [ObjectId(f) if ObjectId.is_valid(f) else HTTPException(status_code=400, detail="ID de fenômeno inválido.") for f in data["fenomenos"]]
     
-    observacao.update(**data)
+    observacao.update(**await asyncio.to_thread(vincular, data))
     observacao.reload()
-    return {"message": "Observação atualizada com sucesso", "data": convert_objectid(observacao.to_mongo().to_dict())}
+    return {"message": "Observação atualizada com sucesso", "data": convert_objectid(observacao.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
 
 @router.delete("/{observacao_id}", response_model=dict)
 async def delete_observacao(observacao_id: str):
@@ -162,5 +293,5 @@ async def delete_observacao(observacao_id: str):
     if not observacao:
         raise HTTPException(status_code=404, detail="Observação não encontrada")
     
-    observacao.delete()
-    return {"message": "Observação excluída com sucesso"}
\ No newline at end of file
+    tarefa = excluir(observacao)
+    return {"message": "Observação excluída com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
\ No newline at end of file
@@ -1,9 +1,37 @@
+import asyncio
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header
 from models.planeta import Planeta
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.objetos import observacoes_do_objeto
+from services.export_colunar import FORMATOS as FORMATOS_EXPORT, exportar
+from services.fisica import atualizar_derivados, preencher_derivados, recalcular_planetas
+from services.single_flight import coalescer
+from services.snapshot_colunar import snapshot_para
+from services.tarefas import fila_tarefas
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("planetas")
+
+FILTRO = EspecificacaoFiltro(
+    Planeta,
+    texto=["nome", "tipo"],
+    intervalos=["periodo_orbital", "raio", "massa"],
+    datas=["data_descoberta"],
+    ordenaveis=["nome", "periodo_orbital", "distancia_da_estrela", "raio", "massa", "data_descoberta"],
+)
+
+FILTRO_HABITAVEIS = EspecificacaoFiltro(
+    Planeta,
+    intervalos=["temperatura_equilibrio", "densidade", "gravidade_superficial", "fluxo_estelar"],
+    igualdades=["zona_habitavel"],
+    ordenaveis=["temperatura_equilibrio", "densidade", "gravidade_superficial", "fluxo_estelar"],
+)
 
 def convert_objectid(doc):
     """Converte ObjectId para string em um dicionário do MongoDB."""
@@ -21,34 +49,93 @@ async def create_planeta(data: dict):
                 raise HTTPException(status_code=400, detail="Formato de data inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
     
         planeta = Planeta(**data)
-        planeta.save()
-        return {"message": "Planeta criado com sucesso", "data": convert_objectid(planeta.to_mongo().to_dict())}
+        # Os derivados entram no próprio documento gravado; a consulta à
+        # estrela roda fora do loop de eventos
+        await asyncio.to_thread(preencher_derivados, planeta)
+        await gravar(planeta)
+        return {"message": "Planeta criado com sucesso", "data": convert_objectid(planeta.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=dict)
-async def get_all_planetas(
+@coalescer
+def get_all_planetas(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    total = Planeta.objects.count()  # Contagem total de registros
-    planetas = Planeta.objects.skip(skip).limit(limit)  # Paginação
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    total = Planeta.objects.read_preference(preferencia).count()  # Contagem total de registros
+    planetas = Planeta.objects.read_preference(preferencia).skip(skip).limit(limit)  # Paginação
     data = [convert_objectid(planeta.to_mongo().to_dict()) for planeta in planetas]
     return {"total": total, "count": len(data), "planetas": data}
 
+@router.get("/export.{formato}")
+async def export_planetas(formato: str):
+    if formato not in FORMATOS_EXPORT:
+        raise HTTPException(status_code=404, detail="Formato de exportação inválido. Use 'arrow' ou 'parquet'.")
+
+    return exportar(Planeta, formato, "planetas", LEITURA)
+
+@router.get("/habitaveis", response_model=dict)
+@coalescer
+def get_planetas_habitaveis(
+    skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    zona_habitavel: bool = Query(True, description="Dentro (True) ou fora (False) da zona habitável conservadora"),
+    temperatura_equilibrio_min: float = Query(None, description="Temperatura de equilíbrio em K (mínimo)"),
+    temperatura_equilibrio_max: float = Query(None, description="Temperatura de equilíbrio em K (máximo)"),
+    densidade_min: float = Query(None, description="Densidade em g/cm³ (mínimo)"),
+    densidade_max: float = Query(None, description="Densidade em g/cm³ (máximo)"),
+    gravidade_superficial_min: float = Query(None, description="Gravidade superficial em m/s² (mínimo)"),
+    gravidade_superficial_max: float = Query(None, description="Gravidade superficial em m/s² (máximo)"),
+    fluxo_estelar_min: float = Query(None, description="Fluxo estelar relativo à Terra (mínimo)"),
+    fluxo_estelar_max: float = Query(None, description="Fluxo estelar relativo à Terra (máximo)"),
+    ordenacao: str = Query(None, description="Ordenar por campo (ex: temperatura_equilibrio, densidade)"),
+    ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    consulta = FILTRO_HABITAVEIS.compilar(
+        ordenacao, ordem_ascendente,
+        zona_habitavel=zona_habitavel,
+        temperatura_equilibrio_min=temperatura_equilibrio_min, temperatura_equilibrio_max=temperatura_equilibrio_max,
+        densidade_min=densidade_min, densidade_max=densidade_max,
+        gravidade_superficial_min=gravidade_superficial_min, gravidade_superficial_max=gravidade_superficial_max,
+        fluxo_estelar_min=fluxo_estelar_min, fluxo_estelar_max=fluxo_estelar_max,
+    )
+
+    total = consulta.queryset(preferencia).count()
+    planetas = consulta.queryset(preferencia).skip(skip).limit(limit)
+    data = [convert_objectid(planeta.to_mongo().to_dict()) for planeta in planetas]
+    return {"total": total, "count": len(data), "planetas": data}
+
+@router.post("/derivados/recalcular", response_model=dict)
+async def recalcular_derivados():
+    tarefa = fila_tarefas.enfileirar("derivados_planetas", recalcular_planetas)
+    return {"message": "Recálculo das grandezas derivadas agendado", "tarefa": tarefa.id}
+
 @router.get("/{planeta_id}", response_model=dict)
-async def get_planeta_by_id(planeta_id: str):
+@coalescer
+def get_planeta_by_id(
+    planeta_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(planeta_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    planeta = Planeta.objects(id=planeta_id).first()
+    planeta = Planeta.objects(id=planeta_id).read_preference(preferencia).first()
     if not planeta:
         raise HTTPException(status_code=404, detail="Planeta não encontrado")
 
     return {"data": convert_objectid(planeta.to_mongo().to_dict())}
 
 @router.get("/{planeta_id}/filtrar", response_model=dict)
-async def get_planetas_by(
+@coalescer
+def get_planetas_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
     nome: str = Query(None, description="Filtrar por nome"),
@@ -63,52 +150,55 @@ async def get_planetas_by(
     data_descoberta_fim: str = Query(None, description="Filtrar por data de descoberta (fim)"),
     ordenacao: str = Query(None, description="Ordenar por campo (ex: nome, periodo_orbital)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
-        query = {}
-        if nome:
-            query["nome"] = {"$regex": nome, "$options": "i"}
-        if tipo:
-            query["tipo"] = {"$regex": tipo, "$options": "i"}
-        if periodo_orbital_min is not None:
-            query["periodo_orbital__gte"] = periodo_orbital_min
-        if periodo_orbital_max is not None:
-            query["periodo_orbital__lte"] = periodo_orbital_max
-        if raio_min is not None:
-            query["raio__gte"] = raio_min
-        if raio_max is not None:
-            query["raio__lte"] = raio_max
-        if massa_min is not None:
-            query["massa__gte"] = massa_min
-        if massa_max is not None:
-            query["massa__lte"] = massa_max
-        if data_descoberta_inicio:
-            try:
-                data_descoberta_inicio = datetime.fromisoformat(data_descoberta_inicio)
-                query["data_descoberta__gte"] = data_descoberta_inicio
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de data de descoberta inicial inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
-        if data_descoberta_fim:
-            try:
-                data_descoberta_fim = datetime.fromisoformat(data_descoberta_fim)
-                query["data_descoberta__lte"] = data_descoberta_fim
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de data de descoberta final inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
-
-        total = Planeta.objects(**query).count()
-
-        if ordenacao:
-            sinal = "" if ordem_ascendente else "-"
-            planetas = Planeta.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
+        consulta = FILTRO.compilar(
+            ordenacao, ordem_ascendente, verificar=False,
+            nome=nome, tipo=tipo,
+            periodo_orbital_min=periodo_orbital_min, periodo_orbital_max=periodo_orbital_max,
+            raio_min=raio_min, raio_max=raio_max, massa_min=massa_min, massa_max=massa_max,
+            data_descoberta_inicio=data_descoberta_inicio, data_descoberta_fim=data_descoberta_fim,
+        )
+
+        snapshot = snapshot_para(Planeta)
+        # Filtros só numéricos são resolvidos no snapshot em memória; quem acabou
+        # de escrever (token de consistência) continua lendo do MongoDB.
+        if snapshot and not (consulta.textos or x_token_consistencia) and snapshot.suporta(consulta.intervalos, ordenacao):
+            total, ids = snapshot.filtrar(consulta.intervalos, ordenacao, ordem_ascendente, skip, limit)
+            planetas = snapshot.buscar(ids)
         else:
-            planetas = Planeta.objects(**query).skip(skip).limit(limit)
+            FILTRO.verificar(consulta)
+            total = consulta.queryset(preferencia).count()
+            planetas = consulta.queryset(preferencia).skip(skip).limit(limit)
 
         data = [convert_objectid(planeta.to_mongo().to_dict()) for planeta in planetas]
         return {"total": total, "count": len(data), "planetas": data}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{planeta_id}/observacoes", response_model=dict)
+@coalescer
+def get_observacoes_by_planeta(
+    planeta_id: str,
+    skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    if not ObjectId.is_valid(planeta_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+
+    observacoes = observacoes_do_objeto("planeta", planeta_id, preferencia)
+    total = observacoes.count()
+    data = [convert_objectid(observacao.to_mongo().to_dict()) for observacao in observacoes.skip(skip).limit(limit)]
+    return {"total": total, "count": len(data), "observacoes": data}
+
+
 @router.put("/{planeta_id}", response_model=dict)
 async def update_planeta(planeta_id: str, data: dict):
     if not ObjectId.is_valid(planeta_id):
@@ -119,8 +209,9 @@ async def update_planeta(planeta_id: str, data: dict):
         raise HTTPException(status_code=404, detail="Planeta não encontrado")
 
     planeta.update(**data)
-    planeta.reload()
-    return {"message": "Planeta atualizado com sucesso", "data": convert_objectid(planeta.to_mongo().to_dict())}
+    await asyncio.to_thread(atualizar_derivados, {"_id": planeta.id})
+    await asyncio.to_thread(planeta.reload)
+    return {"message": "Planeta atualizado com sucesso", "data": convert_objectid(planeta.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
 
 @router.delete("/{planeta_id}", response_model=dict)
 async def delete_planeta(planeta_id: str):
@@ -131,5 +222,5 @@ async def delete_planeta(planeta_id: str):
     if not planeta:
         raise HTTPException(status_code=404, detail="Planeta não encontrado")
 
-    planeta.delete()
-    return {"message": "Planeta deletado com sucesso"}
+    tarefa = excluir(planeta)
+    return {"message": "Planeta deletado com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from services.tarefas import fila_tarefas
+
+router = APIRouter()
+
+@router.get("/", response_model=dict)
+async def get_all_tarefas():
+    data = [tarefa.to_dict() for tarefa in fila_tarefas.listar()]
+    return {"count": len(data), "tarefas": data}
+
+@router.get("/{tarefa_id}", response_model=dict)
+async def get_tarefa_by_id(tarefa_id: str):
+    tarefa = fila_tarefas.obter(tarefa_id)
+    if not tarefa:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+
+    return {"data": tarefa.to_dict()}
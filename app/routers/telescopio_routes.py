@@ -1,9 +1,24 @@
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header
 from models.telescopio import Telescopio
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config.read_preference import preferencia_leitura, preferencia_da_rota, gerar_token_consistencia
+from services.exclusao import excluir
+from services.filtros import EspecificacaoFiltro
+from services.grupo_commit import gravar
+from services.single_flight import coalescer
 
 router = APIRouter()
+LEITURA = preferencia_da_rota("telescopios")
+
+FILTRO = EspecificacaoFiltro(
+    Telescopio,
+    texto=["nome", "tipo", "localizacao"],
+    intervalos=["diametro"],
+    datas=["data_lancamento"],
+    ordenaveis=["nome", "diametro", "data_lancamento"],
+)
 
 def convert_objectid(doc):
     """Converte ObjectId para string em um dicionário do MongoDB."""
@@ -20,34 +35,45 @@ async def create_telescopio(data: dict):
             except ValueError:
                 raise HTTPException(status_code=400, detail="Formato de data inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
         telescopio = Telescopio(**data)
-        telescopio.save()
-        return {"message": "Telescópio criado com sucesso", "data": convert_objectid(telescopio.to_mongo().to_dict())}
+        await gravar(telescopio)
+        return {"message": "Telescópio criado com sucesso", "data": convert_objectid(telescopio.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=dict)
-async def get_all_telescopios(
+@coalescer
+def get_all_telescopios(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
-    total = Telescopio.objects.count()  # Contagem total de registros
-    telescopios = Telescopio.objects.skip(skip).limit(limit)  # Paginação
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
+    total = Telescopio.objects.read_preference(preferencia).count()  # Contagem total de registros
+    telescopios = Telescopio.objects.read_preference(preferencia).skip(skip).limit(limit)  # Paginação
     data = [convert_objectid(telescopio.to_mongo().to_dict()) for telescopio in telescopios]
     return {"total": total, "count": len(data), "telescopios": data}
 
 @router.get("/{telescopio_id}", response_model=dict)
-async def get_telescopio_by_id(telescopio_id: str):
+@coalescer
+def get_telescopio_by_id(
+    telescopio_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     if not ObjectId.is_valid(telescopio_id):
         raise HTTPException(status_code=400, detail="ID inválido")
 
-    telescopio = Telescopio.objects(id=telescopio_id).first()
+    telescopio = Telescopio.objects(id=telescopio_id).read_preference(preferencia).first()
     if not telescopio:
         raise HTTPException(status_code=404, detail="Telescópio não encontrado")
 
     return {"data": convert_objectid(telescopio.to_mongo().to_dict())}
 
 @router.get("/{telescopio_id}/filtrar", response_model=dict)
-async def get_telescopios_by(
+@coalescer
+def get_telescopios_by(
     skip: int = Query(0, ge=0, description="Número de registros a ignorar"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros a retornar"),
     nome: str = Query(None, description="Filtrar por nome"),
@@ -59,56 +85,45 @@ async def get_telescopios_by(
     data_lancamento_fim: str = Query(None, description="Filtrar por data de lançamento (fim)"),
     ordenacao: str = Query(None, description="Ordenar por campo (ex: nome, diametro)"),
     ordem_ascendente: bool = Query(True, description="Ordem ascendente (True) ou descendente (False)"),
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
 ):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
-        query = {}
-        if nome:
-            query["nome"] = {"$regex": nome, "$options": "i"}
-        if tipo:
-            query["tipo"] = {"$regex": tipo, "$options": "i"}
-        if localizacao:
-            query["localizacao"] = {"$regex": localizacao, "$options": "i"}
-        if diametro_min is not None:
-            query["diametro__gte"] = diametro_min
-        if diametro_max is not None:
-            query["diametro__lte"] = diametro_max
-        if data_lancamento_inicio:
-            try:
-                data_lancamento_inicio = datetime.fromisoformat(data_lancamento_inicio)
-                query["data_lancamento__gte"] = data_lancamento_inicio
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de data de lançamento inicial inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
-        if data_lancamento_fim:
-            try:
-                data_lancamento_fim = datetime.fromisoformat(data_lancamento_fim)
-                query["data_lancamento__lte"] = data_lancamento_fim
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de data de lançamento final inválido. Use 'YYYY-MM-DDTHH:MM:SS'.")
+        consulta = FILTRO.compilar(
+            ordenacao, ordem_ascendente,
+            nome=nome, tipo=tipo, localizacao=localizacao,
+            diametro_min=diametro_min, diametro_max=diametro_max,
+            data_lancamento_inicio=data_lancamento_inicio, data_lancamento_fim=data_lancamento_fim,
+        )
 
-        total = Telescopio.objects(**query).count()
-
-        if ordenacao:
-            sinal = "" if ordem_ascendente else "-"
-            telescopios = Telescopio.objects(**query).order_by(sinal + ordenacao).skip(skip).limit(limit)
-        else:
-            telescopios = Telescopio.objects(**query).skip(skip).limit(limit)
+        total = consulta.queryset(preferencia).count()
+        telescopios = consulta.queryset(preferencia).skip(skip).limit(limit)
 
         data = [convert_objectid(telescopio.to_mongo().to_dict()) for telescopio in telescopios]
         return {"total": total, "count": len(data), "telescopios": data}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{telescopio_id}", response_model=dict)
-async def get_telescopio_by_id(telescopio_id: str):
+@coalescer
+def get_telescopio_by_id(
+    telescopio_id: str,
+    x_token_consistencia: str = Header(None, description="Token de consistência devolvido por uma escrita"),
+):
+    preferencia = preferencia_leitura(x_token_consistencia, LEITURA)
     try:
         if not ObjectId.is_valid(telescopio_id):
             raise HTTPException(status_code=400, detail="ID inválido")
 
-        telescopio = Telescopio.objects(id=telescopio_id).first()
+        telescopio = Telescopio.objects(id=telescopio_id).read_preference(preferencia).first()
         if not telescopio:
             raise HTTPException(status_code=404, detail="Telescópio não encontrado")
 
         return {"data": convert_objectid(telescopio.to_mongo().to_dict())}
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -123,7 +138,7 @@ async def update_telescopio(telescopio_id: str, data: dict):
 
     telescopio.update(**data)
     telescopio.reload()
-    return {"message": "Telescópio atualizado com sucesso", "data": convert_objectid(telescopio.to_mongo().to_dict())}
+    return {"message": "Telescópio atualizado com sucesso", "data": convert_objectid(telescopio.to_mongo().to_dict()), "token_consistencia": gerar_token_consistencia()}
 
 @router.delete("/{telescopio_id}", response_model=dict)
 async def delete_telescopio(telescopio_id: str):
@@ -134,5 +149,5 @@ async def delete_telescopio(telescopio_id: str):
     if not telescopio:
         raise HTTPException(status_code=404, detail="Telescópio não encontrado")
 
-    telescopio.delete()
-    return {"message": "Telescópio deletado com sucesso"}
+    tarefa = excluir(telescopio)
+    return {"message": "Telescópio deletado com sucesso", "tarefa_limpeza": tarefa.id, "token_consistencia": gerar_token_consistencia()}
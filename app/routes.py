@@ -1,11 +1,14 @@
 from fastapi import APIRouter
 from routers import (
     astronomo_routes,
+    batch_routes,
     estrela_routes,
     exoplaneta_routes,
     fenomeno_celestial_routes,
+    metrica_routes,
     observacao_routes,
     planeta_routes,
+    tarefa_routes,
     telescopio_routes,
 )
 
@@ -18,3 +21,6 @@ app.include_router(fenomeno_celestial_routes.router, prefix="/fenomenos", tags=[
 app.include_router(observacao_routes.router, prefix="/observacoes", tags=["Observações"])
 app.include_router(planeta_routes.router, prefix="/planetas", tags=["Planetas"])
 app.include_router(telescopio_routes.router, prefix="/telescopios", tags=["Telescópios"])
+app.include_router(tarefa_routes.router, prefix="/tarefas", tags=["Tarefas"])
+app.include_router(metrica_routes.router, prefix="/metricas", tags=["Métricas"])
+app.include_router(batch_routes.router, prefix="/batch", tags=["Batch"])
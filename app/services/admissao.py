@@ -0,0 +1,166 @@
+import asyncio
+import time
+import pymongo
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from config import settings
+
+
+def classificar(caminho):
+    """Classe de admissão da rota, ou None para rotas que não passam pelo controle."""
+    if caminho.startswith("/batch") or caminho.endswith("/stream") or caminho.endswith("/ws"):
+        return None  # sub-requisições do batch são admitidas individualmente
+    if "/export." in caminho:
+        return "export"
+    if caminho.endswith("/filtrar") or "/filtrar/" in caminho or "/consulta_" in caminho:
+        return "pesada"
+    return "leve"
+
+
+class Portao:
+    """Limite de requisições simultâneas de uma classe, com fila limitada."""
+
+    def __init__(self, concorrencia, fila, prazo_ms):
+        self.concorrencia = concorrencia
+        self.fila = fila
+        self.prazo_ms = prazo_ms
+        self.semaforo = asyncio.Semaphore(concorrencia)
+        self.executando = 0
+        self.esperando = 0
+        self.rejeitadas = 0
+        self.canceladas = 0
+
+    def metricas(self):
+        return {
+            "concorrencia": self.concorrencia,
+            "fila": self.fila,
+            "prazo_ms": self.prazo_ms,
+            "executando": self.executando,
+            "esperando": self.esperando,
+            "rejeitadas": self.rejeitadas,
+            "canceladas": self.canceladas,
+        }
+
+
+portoes = {classe: Portao(*limites) for classe, limites in settings.ADMISSAO.items()}
+
+
+async def _aguardar_vaga(portao, receive, mensagens, espera_s):
+    """Espera uma vaga no portão enquanto observa se o cliente desconectou.
+
+    Devolve True quando a vaga foi obtida, False se o cliente foi embora e None
+    se a espera estourou. Mensagens do corpo lidas enquanto espera ficam em
+    `mensagens` para serem repassadas à aplicação.
+    """
+    limite = time.monotonic() + espera_s
+    aquisicao = asyncio.ensure_future(portao.semaforo.acquire())
+    recebimento = asyncio.ensure_future(receive())
+    admitido = None
+    try:
+        while True:
+            pendentes = {aquisicao} if recebimento is None else {aquisicao, recebimento}
+            await asyncio.wait(pendentes, timeout=max(0, limite - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+            # A vaga e o corpo podem chegar na mesma volta: a mensagem lida
+            # precisa ser guardada antes de admitir a requisição
+            if recebimento is not None and recebimento.done():
+                mensagem = recebimento.result()
+                if mensagem["type"] == "http.disconnect":
+                    return False
+                mensagens.append(mensagem)
+                recebimento = asyncio.ensure_future(receive()) if mensagem.get("more_body") else None
+            if aquisicao.done():
+                admitido = True
+                return True
+            if time.monotonic() >= limite:
+                return None
+    finally:
+        if recebimento is not None:
+            recebimento.cancel()
+            if recebimento.done() and not recebimento.cancelled():
+                mensagens.append(recebimento.result())
+        if not admitido:
+            aquisicao.cancel()
+            if aquisicao.done() and not aquisicao.cancelled():
+                portao.semaforo.release()
+
+
+class AdmissaoMiddleware:
+    """Controle de admissão e prazo das consultas por classe de rota.
+
+    Cada classe (`leve`, `pesada`, `export`) tem um limite de requisições
+    simultâneas e uma fila limitada; com a fila cheia, ou se a espera passar do
+    prazo, a resposta é `503` com `Retry-After`. Requisições ainda na fila são
+    descartadas se o cliente desconectar. Depois de admitida, a requisição roda
+    dentro de `pymongo.timeout`, que aplica o prazo restante como `maxTimeMS` a
+    todas as consultas feitas por ela. O cliente pode reduzir o prazo com o
+    cabeçalho `X-Prazo-Ms`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        classe = classificar(scope["path"]) if scope["type"] == "http" else None
+        if classe is None:
+            await self.app(scope, receive, send)
+            return
+
+        portao = portoes[classe]
+        prazo_ms = portao.prazo_ms
+        pedido = Headers(scope=scope).get("x-prazo-ms")
+        if pedido and pedido.isdigit():
+            prazo_ms = min(prazo_ms, int(pedido)) if prazo_ms else int(pedido)
+        inicio = time.monotonic()
+
+        if portao.esperando >= portao.fila:
+            portao.rejeitadas += 1
+            await self._rejeitar(scope, receive, send)
+            return
+
+        mensagens = []
+        portao.esperando += 1
+        try:
+            espera_ms = prazo_ms or settings.ADMISSAO_ESPERA_MAXIMA_MS
+            admitido = await _aguardar_vaga(portao, receive, mensagens, espera_ms / 1000)
+        finally:
+            portao.esperando -= 1
+
+        if admitido is False:
+            portao.canceladas += 1
+            return
+        if admitido is None:
+            portao.rejeitadas += 1
+            await self._rejeitar(scope, receive, send)
+            return
+
+        async def receber():
+            if mensagens:
+                return mensagens.pop(0)
+            return await receive()
+
+        portao.executando += 1
+        try:
+            if prazo_ms:
+                restante = prazo_ms / 1000 - (time.monotonic() - inicio)
+                with pymongo.timeout(max(restante, 0.001)):
+                    await self.app(scope, receber, send)
+            else:
+                await self.app(scope, receber, send)
+        finally:
+            portao.executando -= 1
+            portao.semaforo.release()
+
+    async def _rejeitar(self, scope, receive, send):
+        resposta = JSONResponse(
+            {"detail": "Servidor sobrecarregado, tente novamente em instantes."},
+            status_code=503,
+            headers={"Retry-After": str(settings.ADMISSAO_RETRY_AFTER_SECONDS)},
+        )
+        await resposta(scope, receive, send)
+
+
+async def tratar_erro_mongo(request, exc):
+    """Consultas interrompidas pelo prazo viram `504`; os demais erros do MongoDB, `500`."""
+    if getattr(exc, "timeout", False):
+        return JSONResponse({"detail": "Tempo limite da consulta excedido."}, status_code=504)
+    return JSONResponse({"detail": str(exc)}, status_code=500)
@@ -0,0 +1,168 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, PyMongoError
+from config import settings
+from models.observacao import Observacao, ObservacaoArquivada
+from services.tarefas import fila_tarefas
+
+# Documento que reserva cada execução agendada para um único worker
+AGENDAMENTO = "agendamentos"
+TAREFA_AGENDADA = "arquivamento_observacoes"
+
+
+def _colecao_arquivo():
+    """Coleção de arquivo, criada com compressão zstd na primeira execução."""
+    db = ObservacaoArquivada._get_db()
+    nome = ObservacaoArquivada._get_collection_name()
+    if not db.list_collection_names(filter={"name": nome}):
+        try:
+            db.create_collection(nome, storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}})
+        except CollectionInvalid:
+            pass  # criada por outro worker
+    return ObservacaoArquivada._get_collection()
+
+
+def arquivar(tarefa, dias=None):
+    """Move as observações com mais de `dias` dias para o arquivo, em lotes de `ARQUIVO_LOTE`.
+
+    Cada lote é copiado e só então removido da coleção principal; se uma
+    execução for interrompida entre as duas etapas, a próxima ignora os
+    documentos já copiados.
+    """
+    dias = dias or settings.ARQUIVO_DIAS
+    if dias <= 0:
+        raise ValueError("Informe a idade mínima, em dias, das observações a arquivar")
+    limite = datetime.utcnow() - timedelta(days=dias)
+    origem = Observacao._get_collection()
+    destino = _colecao_arquivo()
+    tarefa.progresso["limite"] = limite
+
+    while True:
+        lote = list(origem.find({"datahora": {"$lt": limite}}).hint("datahora_1").limit(settings.ARQUIVO_LOTE))
+        if not lote:
+            break
+        try:
+            destino.insert_many(lote, ordered=False)
+        except BulkWriteError as erro:
+            if any(falha["code"] != 11000 for falha in erro.details["writeErrors"]):
+                raise
+        origem.delete_many({"_id": {"$in": [documento["_id"] for documento in lote]}})
+        tarefa.progresso["arquivadas"] = tarefa.progresso.get("arquivadas", 0) + len(lote)
+
+
+def corte():
+    """Data da observação arquivada mais recente (None com o arquivo vazio).
+
+    Lida a cada consulta, pelo índice de `datahora`: como os lotes são
+    copiados antes de removidos, o valor vale para todos os workers assim
+    que um arquivamento grava o lote.
+    """
+    documento = ObservacaoArquivada._get_collection().find_one({}, {"datahora": 1}, sort=[("datahora", -1)])
+    return documento["datahora"] if documento else None
+
+
+def alcanca_arquivo(consulta):
+    """Se o intervalo de `datahora` da consulta compilada inclui datas já arquivadas."""
+    ultima = corte()
+    if ultima is None:
+        return False
+    inicio, _ = consulta.intervalos.get("datahora", (None, None))
+    return inicio is None or inicio <= ultima
+
+
+def _contar(consulta, preferencia, modelo):
+    # Sem filtro (listagem simples), a contagem vem dos metadados da coleção
+    if not consulta.query:
+        return modelo._get_collection().estimated_document_count()
+    return consulta.queryset(preferencia, modelo).count()
+
+
+def consultar(consulta, preferencia, skip, limit):
+    """Executa a consulta de observações nas coleções principal e de arquivo.
+
+    O arquivo só é consultado quando o intervalo de `datahora` chega até ele.
+    Sem ordenação, as observações recentes vêm primeiro; com ordenação, as
+    duas páginas candidatas são intercaladas, o que limita `skip` a
+    `ARQUIVO_SKIP_MAXIMO`. Devolve (total, documentos da página).
+    """
+    if not alcanca_arquivo(consulta):
+        total = _contar(consulta, preferencia, Observacao)
+        return total, list(consulta.queryset(preferencia).skip(skip).limit(limit))
+
+    if consulta.ordem and skip > settings.ARQUIVO_SKIP_MAXIMO:
+        # Cada coleção devolveria skip + limit documentos para a intercalação
+        raise HTTPException(
+            status_code=400,
+            detail=f"Com ordenação e observações arquivadas, 'skip' pode ir até {settings.ARQUIVO_SKIP_MAXIMO}; "
+            "restrinja o intervalo de datahora para avançar.",
+        )
+
+    querysets = [consulta.queryset(preferencia), consulta.queryset(preferencia, ObservacaoArquivada)]
+    totais = [_contar(consulta, preferencia, modelo) for modelo in (Observacao, ObservacaoArquivada)]
+
+    if not consulta.ordem:
+        recentes = list(querysets[0].skip(skip).limit(limit)) if skip < totais[0] else []
+        restante = limit - len(recentes)
+        antigas = list(querysets[1].skip(max(skip - totais[0], 0)).limit(restante)) if restante else []
+        return sum(totais), recentes + antigas
+
+    campo = consulta.ordem.lstrip("-")
+    candidatos = [documento for queryset in querysets for documento in queryset.limit(skip + limit)]
+    # Ausentes primeiro na ordem ascendente, como no MongoDB
+    candidatos.sort(
+        key=lambda documento: (getattr(documento, campo) is not None, getattr(documento, campo)),
+        reverse=consulta.ordem.startswith("-"),
+    )
+    return sum(totais), candidatos[skip:skip + limit]
+
+
+def buscar(observacao_id, preferencia):
+    """Observação pelo id, procurando no arquivo se não estiver na coleção principal."""
+    observacao = Observacao.objects(id=observacao_id).read_preference(preferencia).first()
+    if observacao is None:
+        observacao = ObservacaoArquivada.objects(id=observacao_id).read_preference(preferencia).first()
+    return observacao
+
+
+def _reservar_execucao():
+    """Reserva a execução vencida para este processo; False se outro worker já a reservou.
+
+    O documento guarda o horário da próxima execução: só o worker cujo
+    update encontra o horário vencido o adianta, e o upsert dos demais
+    falha com chave duplicada.
+    """
+    agora = datetime.utcnow()
+    try:
+        ObservacaoArquivada._get_db()[AGENDAMENTO].find_one_and_update(
+            {"_id": TAREFA_AGENDADA, "proxima": {"$lte": agora}},
+            {"$set": {
+                "proxima": agora + timedelta(seconds=settings.ARQUIVO_INTERVALO_SECONDS),
+                "reservada_por": f"{socket.gethostname()}:{os.getpid()}",
+                "reservada_em": agora,
+            }},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def _agendar():
+    # Todos os workers verificam o agendamento, mas cada execução roda em um só
+    espera = min(settings.ARQUIVO_INTERVALO_SECONDS, 60)
+    while True:
+        try:
+            if _reservar_execucao():
+                fila_tarefas.enfileirar(TAREFA_AGENDADA, arquivar)
+        except PyMongoError as e:
+            print("❌ Erro ao agendar o arquivamento de observações:", e)
+        time.sleep(espera)
+
+
+def iniciar_arquivamento():
+    if settings.ARQUIVO_DIAS > 0:
+        threading.Thread(target=_agendar, name="arquivamento", daemon=True).start()
@@ -0,0 +1,416 @@
+import csv
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from bson import ObjectId
+from mongoengine import DateTimeField, FloatField
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.estrela import Estrela
+from models.exoplaneta import Exoplaneta
+from models.planeta import Planeta
+from services.fisica import CAMPOS_DERIVADOS, calcular_derivados
+
+try:
+    from astropy.table import Table
+except ImportError:
+    Table = None
+
+FORMATOS = {".csv": "csv", ".fits": "fits", ".fit": "fits", ".vot": "votable", ".xml": "votable"}
+
+
+def _log10_inverso(valor):
+    numero = _numero(valor)
+    return None if numero is None else 10 ** numero
+
+
+# Para cada campo, as colunas aceitas no arquivo (sem diferenciar maiúsculas),
+# na ordem de preferência. Os nomes do NASA Exoplanet Archive vêm depois dos
+# nomes dos próprios modelos; `st_lum` é log10 da luminosidade solar.
+COLUNAS = {
+    "estrela": {
+        "nome": ["nome", "hostname", "star_name"],
+        "tipo_espectral": ["tipo_espectral", "st_spectype", "spec_type"],
+        "magnitude": ["magnitude", "sy_vmag", "st_vmag", "vmag"],
+        "distancia": ["distancia", "sy_dist", "st_dist"],
+        "luminosidade": ["luminosidade", ("st_lum", _log10_inverso)],
+        "temperatura": ["temperatura", "st_teff", "teff"],
+        "idade": ["idade", "st_age"],
+    },
+    "planeta": {
+        "nome": ["nome", "pl_name", "planet_name"],
+        "tipo": ["tipo", "pl_type"],
+        "periodo_orbital": ["periodo_orbital", "pl_orbper", "orbital_period"],
+        "distancia_da_estrela": ["distancia_da_estrela", "pl_orbsmax", "semi_major_axis"],
+        "raio": ["raio", "pl_rade"],
+        "massa": ["massa", "pl_bmasse", "pl_masse"],
+        "composicao_atmosferica": ["composicao_atmosferica"],
+        "data_descoberta": ["data_descoberta", "disc_year"],
+        "estrela": ["estrela", "hostname", "star_name"],
+    },
+}
+
+MODELOS = {"estrela": Estrela, "planeta": Planeta}
+
+
+def _numero(valor):
+    if valor is None or valor == "":
+        return None
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(numero) else numero
+
+
+def _texto(valor):
+    if isinstance(valor, bytes):
+        valor = valor.decode("utf-8", "replace")
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _data(valor):
+    """Data ISO (`2019-05-01`) ou apenas o ano da descoberta."""
+    texto = _texto(valor)
+    if texto is None:
+        return None
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        numero = _numero(texto)
+        return datetime(int(numero), 1, 1) if numero else None
+
+
+def _conversor(modelo, campo):
+    tipo = modelo._fields[campo] if campo in modelo._fields else None
+    if isinstance(tipo, FloatField):
+        return _numero
+    if isinstance(tipo, DateTimeField):
+        return _data
+    return _texto
+
+
+def mapear_colunas(tipo, cabecalho, substituicoes=None):
+    """Escolhe a coluna de cada campo: {tipo_documento: {campo: (posição, conversor)}}.
+
+    Para arquivos de planetas, as colunas da estrela hospedeira também são
+    mapeadas (o nome da estrela vem da coluna do campo `estrela`).
+    """
+    posicoes = {nome.lower(): i for i, nome in enumerate(cabecalho)}
+    substituicoes = substituicoes or {}
+
+    def mapear(documento):
+        modelo, mapa = MODELOS[documento], {}
+        for campo, colunas in COLUNAS[documento].items():
+            if campo in substituicoes:
+                colunas = [substituicoes[campo]]
+            for coluna in colunas:
+                coluna, conversor = coluna if isinstance(coluna, tuple) else (coluna, _conversor(modelo, campo))
+                if coluna.lower() in posicoes:
+                    mapa[campo] = (posicoes[coluna.lower()], conversor)
+                    break
+        return mapa
+
+    if tipo == "estrela":
+        return {"estrela": mapear("estrela")}
+
+    planeta = mapear("planeta")
+    hospedeira = {campo: valor for campo, valor in mapear("estrela").items() if campo != "nome"}
+    if "estrela" in planeta:
+        hospedeira["nome"] = (planeta["estrela"][0], _texto)
+    return {"planeta": planeta, "estrela": hospedeira}
+
+
+def id_deterministico(*partes):
+    """ObjectId derivado do conteúdo, para que recarregar um lote não duplique documentos."""
+    return ObjectId(hashlib.md5(":".join(partes).encode()).digest()[:12])
+
+
+def processar_lote(argumentos):
+    """Converte as linhas brutas de um lote em documentos (executado no pool de processos).
+
+    Devolve (índice, documentos, rejeitadas); cada documento é um dict com os
+    campos do modelo e, para planetas, o dict da estrela hospedeira em `_estrela`.
+    """
+    indice, formato, linhas, mapa = argumentos
+    if formato == "csv":
+        linhas = csv.reader(linhas)
+
+    documentos, rejeitadas = [], 0
+    for linha in linhas:
+        documento = {}
+        for tipo_documento, campos in mapa.items():
+            documento[tipo_documento] = {
+                campo: conversor(linha[posicao]) if posicao < len(linha) else None
+                for campo, (posicao, conversor) in campos.items()
+            }
+        principal = documento["planeta"] if "planeta" in mapa else documento["estrela"]
+        if not principal.get("nome"):
+            rejeitadas += 1
+            continue
+
+        principal = {campo: valor for campo, valor in principal.items() if valor is not None}
+        if "planeta" in mapa:
+            principal["_estrela"] = {campo: valor for campo, valor in documento["estrela"].items() if valor is not None}
+        documentos.append(principal)
+    return indice, documentos, rejeitadas
+
+
+class Checkpoint:
+    """Último lote contínuo já gravado, salvo ao lado do arquivo de entrada."""
+
+    def __init__(self, caminho, identidade, ativo=True):
+        self.caminho = caminho + ".checkpoint.json"
+        self.identidade = identidade
+        self.ativo = ativo
+        self.concluidos = 0
+        self._pendentes = set()
+        self._lock = threading.Lock()
+        if ativo and os.path.exists(self.caminho):
+            with open(self.caminho, encoding="utf-8") as arquivo:
+                salvo = json.load(arquivo)
+            if salvo.get("identidade") == identidade:
+                self.concluidos = salvo["concluidos"]
+
+    def concluir(self, indice):
+        with self._lock:
+            self._pendentes.add(indice)
+            while self.concluidos in self._pendentes:
+                self._pendentes.remove(self.concluidos)
+                self.concluidos += 1
+            if self.ativo:
+                temporario = self.caminho + ".tmp"
+                with open(temporario, "w", encoding="utf-8") as arquivo:
+                    json.dump({"identidade": self.identidade, "concluidos": self.concluidos}, arquivo)
+                os.replace(temporario, self.caminho)
+
+    def remover(self):
+        if self.ativo and os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+
+class Relatorio:
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.linhas = 0
+        self.rejeitadas = 0
+        self.inseridos = {"estrelas": 0, "planetas": 0, "exoplanetas": 0}
+        self.duplicados = 0
+        # Linhas de estrelas ignoradas porque o nome já estava cadastrado (ou repetido no arquivo)
+        self.nomes_existentes = 0
+        self.exemplos_existentes = []
+        self._lock = threading.Lock()
+
+    def somar(self, inseridos, duplicados):
+        with self._lock:
+            for colecao, quantidade in inseridos.items():
+                self.inseridos[colecao] += quantidade
+            self.duplicados += duplicados
+
+    def nome_existente(self, nome):
+        with self._lock:
+            self.nomes_existentes += 1
+            if len(self.exemplos_existentes) < 5:
+                self.exemplos_existentes.append(nome)
+
+    def resumo(self):
+        decorrido = max(time.monotonic() - self.inicio, 1e-9)
+        documentos = sum(self.inseridos.values())
+        return (
+            f"{self.linhas} linhas ({self.linhas / decorrido:.0f}/s), {self.rejeitadas} rejeitadas | "
+            + ", ".join(f"{quantidade} {colecao}" for colecao, quantidade in self.inseridos.items())
+            + f" ({documentos / decorrido:.0f} documentos/s), {self.duplicados} já existentes"
+            + self._resumo_nomes()
+            + f" | {decorrido:.1f}s"
+        )
+
+    def _resumo_nomes(self):
+        if not self.nomes_existentes:
+            return ""
+        exemplos = ", ".join(self.exemplos_existentes)
+        return f", {self.nomes_existentes} estrelas ignoradas por nome já existente (ex.: {exemplos})"
+
+
+def ler_lotes(caminho, formato, tamanho_lote):
+    """Gera (cabeçalho, lotes) com as linhas brutas do arquivo, sem convertê-las."""
+    if formato == "csv":
+        with open(caminho, encoding="utf-8", newline="") as arquivo:
+            cabecalho = next(csv.reader([_cabecalho_csv(arquivo)]))
+
+        def lotes():
+            # O arquivo é aberto só quando a leitura começa e fechado mesmo se
+            # o gerador for abandonado antes do fim
+            with open(caminho, encoding="utf-8", newline="") as arquivo:
+                _cabecalho_csv(arquivo)
+                lote = []
+                for linha in arquivo:
+                    if linha.strip() and not linha.startswith("#"):
+                        lote.append(linha)
+                    if len(lote) == tamanho_lote:
+                        yield lote
+                        lote = []
+                if lote:
+                    yield lote
+
+        return cabecalho, lotes()
+
+    if Table is None:
+        raise RuntimeError("Leitura de FITS e VOTable exige o pacote astropy.")
+    tabela = Table.read(caminho, format=formato)
+    colunas = [_valores(tabela[nome]) for nome in tabela.colnames]
+
+    def lotes():
+        for inicio in range(0, len(tabela), tamanho_lote):
+            yield list(zip(*(coluna[inicio:inicio + tamanho_lote] for coluna in colunas)))
+
+    return list(tabela.colnames), lotes()
+
+
+def _cabecalho_csv(arquivo):
+    """Linha do cabeçalho, pulando comentários (`#`) como nos exports do NASA Exoplanet Archive."""
+    linha = arquivo.readline()
+    while linha.startswith("#"):
+        linha = arquivo.readline()
+    return linha
+
+
+def _valores(coluna):
+    """Coluna do astropy como lista Python, com None nos valores mascarados."""
+    mascara = getattr(coluna, "mask", None)
+    valores = np.asarray(coluna).tolist()
+    if mascara is None or not np.any(mascara):
+        return valores
+    return [None if ausente else valor for valor, ausente in zip(valores, np.asarray(mascara).tolist())]
+
+
+class Carregador:
+    """Resolve referências em memória e grava os lotes com inserções em massa paralelas."""
+
+    def __init__(self, tipo, exoplanetas, escritores, relatorio):
+        self.tipo = tipo
+        self.exoplanetas = exoplanetas
+        self.relatorio = relatorio
+        self.escritores = ThreadPoolExecutor(max_workers=escritores)
+        self._vagas = threading.Semaphore(escritores * 2)
+        # nome -> (id, luminosidade, temperatura) de todas as estrelas conhecidas
+        self.estrelas = {
+            documento["nome"]: (documento["_id"], documento.get("luminosidade"), documento.get("temperatura"))
+            for documento in Estrela._get_collection().find({}, {"nome": 1, "luminosidade": 1, "temperatura": 1})
+        }
+
+    def enviar(self, indice, documentos, ao_concluir):
+        """Resolve o lote (na thread principal, em ordem) e agenda sua gravação.
+
+        Em cargas de planetas, as estrelas hospedeiras novas são gravadas antes
+        de agendar o lote, para que as referências de planetas de lotes
+        seguintes, gravados em paralelo, já encontrem a estrela. Em cargas de
+        estrelas, o lote inteiro vai para os escritores em paralelo.
+        """
+        lote = self._resolver(documentos)
+        if self.tipo == "planeta":
+            self._inserir(lote, "estrelas", Estrela)
+            lote["estrelas"] = []
+        self._vagas.acquire()
+        futuro = self.escritores.submit(self._gravar, lote)
+        futuro.add_done_callback(lambda f: (self._vagas.release(), f.exception() is None and ao_concluir(indice)))
+        return futuro
+
+    def encerrar(self):
+        self.escritores.shutdown(wait=True)
+
+    def _estrela(self, dados, novas):
+        nome = dados["nome"]
+        if nome not in self.estrelas:
+            dados = {**dados, "_id": id_deterministico("estrela", nome)}
+            self.estrelas[nome] = (dados["_id"], dados.get("luminosidade"), dados.get("temperatura"))
+            novas.append(dados)
+        return self.estrelas[nome]
+
+    def _resolver(self, documentos):
+        lote = {"estrelas": [], "planetas": [], "exoplanetas": [], "referencias": {}}
+        if self.tipo == "estrela":
+            for documento in documentos:
+                if documento["nome"] in self.estrelas:
+                    self.relatorio.nome_existente(documento["nome"])
+                    continue
+                self._estrela(documento, lote["estrelas"])
+            return lote
+
+        hospedeiras = []
+        for documento in documentos:
+            dados_estrela = documento.pop("_estrela")
+            documento["_id"] = id_deterministico("planeta", documento["nome"])
+            hospedeira = self._estrela(dados_estrela, lote["estrelas"]) if dados_estrela.get("nome") else None
+            hospedeiras.append(hospedeira)
+            if hospedeira is None:
+                continue
+
+            documento["estrela"] = hospedeira[0]
+            referencias = lote["referencias"].setdefault(hospedeira[0], {"planetas": [], "exoplanetas": []})
+            referencias["planetas"].append(documento["_id"])
+            if self.exoplanetas:
+                exoplaneta = {
+                    "_id": id_deterministico("exoplaneta", documento["nome"]),
+                    "nome": documento["nome"],
+                    "estrela": hospedeira[0],
+                    "planetas": [documento["_id"]],
+                }
+                documento["exoplanetas"] = [exoplaneta["_id"]]
+                referencias["exoplanetas"].append(exoplaneta["_id"])
+                lote["exoplanetas"].append(exoplaneta)
+
+        self._derivados(documentos, hospedeiras)
+        lote["planetas"] = documentos
+        return lote
+
+    @staticmethod
+    def _derivados(planetas, hospedeiras):
+        """Calcula as grandezas de services/fisica.py com os dados já em memória."""
+        def coluna(valores):
+            return np.array([np.nan if valor is None else valor for valor in valores], dtype=np.float64)
+
+        derivados = calcular_derivados(
+            coluna(planeta.get("distancia_da_estrela") for planeta in planetas),
+            coluna(planeta.get("raio") for planeta in planetas),
+            coluna(planeta.get("massa") for planeta in planetas),
+            coluna(hospedeira[1] if hospedeira else None for hospedeira in hospedeiras),
+            coluna(hospedeira[2] if hospedeira else None for hospedeira in hospedeiras),
+        )
+        for i, planeta in enumerate(planetas):
+            for campo in CAMPOS_DERIVADOS:
+                valor = derivados[campo][i]
+                if np.isfinite(valor):
+                    planeta[campo] = bool(valor) if campo == "zona_habitavel" else float(valor)
+
+    def _inserir(self, lote, colecao, modelo):
+        """insert_many não ordenado; documentos já gravados numa execução anterior são ignorados."""
+        if not lote[colecao]:
+            return
+        try:
+            inseridos, duplicados = len(modelo._get_collection().insert_many(lote[colecao], ordered=False).inserted_ids), 0
+        except BulkWriteError as erro:
+            falhas = erro.details["writeErrors"]
+            if any(falha["code"] != 11000 for falha in falhas):
+                raise
+            inseridos, duplicados = erro.details["nInserted"], len(falhas)
+        self.relatorio.somar({colecao: inseridos}, duplicados)
+
+    def _gravar(self, lote):
+        self._inserir(lote, "estrelas", Estrela)
+        self._inserir(lote, "planetas", Planeta)
+        self._inserir(lote, "exoplanetas", Exoplaneta)
+        operacoes = [
+            UpdateOne({"_id": estrela_id}, {"$addToSet": {campo: {"$each": ids} for campo, ids in listas.items() if ids}})
+            for estrela_id, listas in lote["referencias"].items()
+        ]
+        if operacoes:
+            Estrela._get_collection().bulk_write(operacoes, ordered=False)
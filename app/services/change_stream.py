@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+import traceback
+from collections import deque
+from pymongo.errors import OperationFailure, PyMongoError
+from config import settings
+
+
+class Assinatura:
+    """Cliente inscrito no hub, com filtros próprios e um buffer limitado."""
+
+    def __init__(self, loop, filtros, tamanho_buffer):
+        self.loop = loop
+        self.filtros = {campo: valor for campo, valor in filtros.items() if valor}
+        self.fila = asyncio.Queue(maxsize=tamanho_buffer)
+        self.descartados = 0
+
+    def aceita(self, evento):
+        if not self.filtros:
+            return True
+        documento = evento.get("documento")
+        if documento is None:  # exclusões só trazem o _id
+            return False
+        for campo, valor in self.filtros.items():
+            atual = documento.get(campo)
+            if isinstance(atual, list):
+                if valor not in [str(item) for item in atual]:
+                    return False
+            elif str(atual) != valor:
+                return False
+        return True
+
+    def entregar(self, evento):
+        """Executado no loop do cliente; descarta o evento mais antigo se o buffer estiver cheio."""
+        if not self.aceita(evento):
+            return
+        if self.fila.full():
+            self.fila.get_nowait()
+            self.descartados += 1
+        self.fila.put_nowait(evento)
+
+
+class ChangeStreamHub:
+    """Um único change stream por worker, distribuído entre os assinantes.
+
+    O stream é aberto na primeira inscrição, numa thread própria, e retomado
+    a partir do último resume token se a conexão cair, com espera crescente
+    entre as tentativas. Os eventos recentes ficam num histórico para que
+    clientes que reconectam com o último id recebido não percam nada. Se o
+    servidor não suporta change streams (MongoDB fora de replica set), o hub
+    desiste e `suportado` fica False.
+    """
+
+    # "$changeStream is only supported on replica sets"
+    CODIGOS_SEM_SUPORTE = {40573}
+    ESPERA_MAXIMA_SECONDS = 60
+
+    def __init__(self, colecao, tamanho_historico=1000):
+        self._colecao = colecao
+        self._historico = deque(maxlen=tamanho_historico)
+        self._assinaturas = set()
+        self._ouvintes = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ultimo_token = None
+        self._aberto = threading.Event()
+        self.suportado = True
+
+    def iniciar(self, aguardar=False):
+        """Inicia a thread do stream; com `aguardar`, bloqueia até o stream estar aberto."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name="change-stream", daemon=True)
+                self._thread.start()
+        if aguardar and not self._aberto.wait(timeout=30):
+            print("❌ Change stream ainda não foi aberto; eventos anteriores podem ser perdidos")
+
+    def adicionar_ouvinte(self, callback):
+        """Registra um callback síncrono chamado (na thread do stream) a cada evento.
+
+        Só retorna depois que o stream foi aberto, de modo que quem lê a
+        coleção em seguida (carga inicial) não perde alterações feitas
+        durante a leitura.
+        """
+        with self._lock:
+            self._ouvintes.append(callback)
+        self.iniciar(aguardar=True)
+
+    def inscrever(self, filtros, ultimo_id=None, tamanho_buffer=100):
+        """Cria uma assinatura; com `ultimo_id`, reenvia os eventos posteriores a ele.
+
+        Devolve a assinatura e um booleano indicando se o histórico cobria o
+        `ultimo_id` informado (False significa que eventos podem ter sido perdidos).
+        """
+        assinatura = Assinatura(asyncio.get_running_loop(), filtros, tamanho_buffer)
+        completo = True
+        with self._lock:
+            if ultimo_id:
+                ids = [evento["id"] for evento in self._historico]
+                if ultimo_id in ids:
+                    for evento in list(self._historico)[ids.index(ultimo_id) + 1:]:
+                        assinatura.entregar(evento)
+                else:
+                    completo = False
+            self._assinaturas.add(assinatura)
+        self.iniciar()
+        return assinatura, completo
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def _publicar(self, change):
+        evento = {
+            "id": change["_id"]["_data"],
+            "operacao": change["operationType"],
+            "documento_id": str(change.get("documentKey", {}).get("_id")),
+            "documento": change.get("fullDocument"),
+        }
+        with self._lock:
+            self._historico.append(evento)
+            assinaturas = list(self._assinaturas)
+            ouvintes = list(self._ouvintes)
+        for assinatura in assinaturas:
+            try:
+                assinatura.loop.call_soon_threadsafe(assinatura.entregar, evento)
+            except RuntimeError:  # loop do cliente já foi encerrado
+                self.cancelar(assinatura)
+        for ouvinte in ouvintes:
+            try:
+                ouvinte(evento)
+            except Exception as e:
+                print("❌ Erro ao processar evento do change stream:", e)
+
+    def _executar(self):
+        espera = 1
+        while True:
+            try:
+                with self._colecao().watch(full_document="updateLookup", resume_after=self._ultimo_token) as stream:
+                    self._aberto.set()
+                    while stream.alive:
+                        change = stream.try_next()
+                        # Sem eventos, guarda o token da posição atual para que uma
+                        # reconexão retome daqui, e não do instante em que reabrir
+                        self._ultimo_token = stream.resume_token
+                        if change is not None:
+                            self._publicar(change)
+                            espera = 1
+            except OperationFailure as e:
+                if e.code in self.CODIGOS_SEM_SUPORTE:
+                    print("❌ Change streams não suportados (o MongoDB precisa rodar como replica set):", e)
+                    self.suportado = False
+                    self._aberto.set()
+                    return
+                # Token fora do oplog: recomeça do instante atual
+                print("❌ Não foi possível retomar o change stream:", e)
+                self._ultimo_token = None
+            except PyMongoError as e:
+                print("❌ Change stream interrompido, reconectando:", e)
+            except Exception:
+                print("❌ Erro inesperado no change stream, reconectando:")
+                traceback.print_exc()
+            time.sleep(espera)
+            espera = min(espera * 2, self.ESPERA_MAXIMA_SECONDS)
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def hub_para(modelo):
+    """Hub compartilhado do worker para a coleção de um Document do mongoengine."""
+    with _hubs_lock:
+        if modelo not in _hubs:
+            _hubs[modelo] = ChangeStreamHub(modelo._get_collection, settings.STREAM_HISTORICO)
+        return _hubs[modelo]
@@ -0,0 +1,92 @@
+from fastapi import HTTPException
+from mongoengine import ListField
+from config import settings
+from models.astronomo import Astronomo
+from models.estrela import Estrela
+from models.exoplaneta import Exoplaneta
+from models.fenomeno_celestial import FenomenoCelestial
+from models.observacao import Observacao
+from models.planeta import Planeta
+from models.telescopio import Telescopio
+from services.tarefas import fila_tarefas
+
+NULLIFY = "nullify"
+CASCADE = "cascade"
+DENY = "deny"
+
+# Para cada modelo, os campos de outros modelos que guardam referências a ele
+RELACIONAMENTOS = {
+    Estrela: [(Planeta, "estrela"), (Exoplaneta, "estrela"), (Observacao, "objeto_ref")],
+    Planeta: [(Estrela, "planetas"), (Exoplaneta, "planetas"), (Observacao, "objeto_ref")],
+    Exoplaneta: [(Estrela, "exoplanetas"), (Planeta, "exoplanetas"), (Observacao, "objeto_ref")],
+    Astronomo: [(Observacao, "astronomo")],
+    Telescopio: [(Observacao, "telescopio")],
+    FenomenoCelestial: [(Observacao, "fenomenos")],
+    Observacao: [(Astronomo, "observacoes"), (FenomenoCelestial, "observacoes"), (Telescopio, "observacao")],
+}
+
+# Campos removidos junto com a referência quando ela é anulada
+CAMPOS_ASSOCIADOS = {
+    (Observacao, "objeto_ref"): ["objeto_tipo"],
+}
+
+
+def _carregar_politicas(valor):
+    politicas = {}
+    for item in filter(None, (parte.strip() for parte in valor.split(","))):
+        relacao, _, politica = item.partition("=")
+        if politica not in (NULLIFY, CASCADE, DENY):
+            raise ValueError(f"Política de exclusão inválida: {item}")
+        politicas[relacao] = politica
+    return politicas
+
+
+POLITICAS = _carregar_politicas(settings.POLITICA_EXCLUSAO)
+
+
+def politica(modelo, campo):
+    return POLITICAS.get(f"{modelo.__name__}.{campo}", NULLIFY)
+
+
+def excluir(documento):
+    """Exclui o documento e agenda a limpeza das referências a ele.
+
+    Relações com política `deny` são verificadas antes da exclusão; as demais
+    são tratadas em segundo plano. Devolve a tarefa de limpeza.
+    """
+    modelo = type(documento)
+    for relacionado, campo in RELACIONAMENTOS[modelo]:
+        if politica(relacionado, campo) == DENY and relacionado.objects(**{campo: documento.id}).first():
+            raise HTTPException(
+                status_code=409,
+                detail=f"Existem registros de {relacionado.__name__} que referenciam este documento ({campo})",
+            )
+
+    documento.delete()
+    return fila_tarefas.enfileirar(f"limpeza_{modelo.__name__}", limpar_referencias, modelo, [documento.id])
+
+
+def limpar_referencias(tarefa, modelo, ids):
+    """Remove as referências a `ids` em lotes de `EXCLUSAO_LOTE` documentos."""
+    for relacionado, campo in RELACIONAMENTOS[modelo]:
+        colecao = relacionado._get_collection()
+        chave = f"{relacionado.__name__}.{campo}"
+        filtro = {campo: {"$in": ids}}
+        acao = politica(relacionado, campo)
+
+        while True:
+            lote = [doc["_id"] for doc in colecao.find(filtro, {"_id": 1}).limit(settings.EXCLUSAO_LOTE)]
+            if not lote:
+                break
+
+            if acao == CASCADE:
+                colecao.delete_many({"_id": {"$in": lote}})
+                limpar_referencias(tarefa, relacionado, lote)
+            elif isinstance(relacionado._fields[campo], ListField):
+                colecao.update_many({"_id": {"$in": lote}}, {"$pull": {campo: {"$in": ids}}})
+            else:
+                # `deny` só chega aqui em exclusões em cascata, em que o documento já foi removido
+                campos = [campo] + CAMPOS_ASSOCIADOS.get((relacionado, campo), [])
+                colecao.update_many({"_id": {"$in": lote}}, {"$unset": {nome: "" for nome in campos}})
+
+            tarefa.progresso[chave] = tarefa.progresso.get(chave, 0) + len(lote)
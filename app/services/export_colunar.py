@@ -0,0 +1,125 @@
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from mongoengine import DateTimeField, FloatField, IntField, ReferenceField, StringField, BooleanField
+from config import settings
+from config.read_preference import preferencia_leitura
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FORMATOS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class _Buffer:
+    """Destino de escrita do pyarrow que acumula bytes até serem enviados ao cliente."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def consumir(self):
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _tipo_arrow(campo):
+    if isinstance(campo, FloatField):
+        return pa.float64()
+    if isinstance(campo, IntField):
+        return pa.int64()
+    if isinstance(campo, BooleanField):
+        return pa.bool_()
+    if isinstance(campo, DateTimeField):
+        return pa.timestamp("ms")
+    if isinstance(campo, (StringField, ReferenceField)):
+        return pa.string()
+    return None
+
+
+def esquema(modelo):
+    """Esquema Arrow com os campos escalares do modelo; listas de referências ficam de fora."""
+    colunas = [pa.field("_id", pa.string(), nullable=False)]
+    for nome, campo in modelo._fields.items():
+        tipo = _tipo_arrow(campo)
+        if nome != "id" and tipo is not None:
+            colunas.append(pa.field(campo.db_field, tipo))
+    return pa.schema(colunas)
+
+
+def _lotes(modelo, schema, preferencia):
+    """Lê o cursor em blocos de `EXPORT_LOTE` documentos e monta um RecordBatch por bloco."""
+    colecao = modelo._get_collection().with_options(read_preference=preferencia or preferencia_leitura())
+    projecao = {nome: 1 for nome in schema.names}
+    cursor = colecao.find({}, projecao, batch_size=min(settings.EXPORT_LOTE, 10000))
+
+    colunas = {nome: [] for nome in schema.names}
+    quantidade = 0
+    for documento in cursor:
+        for nome, valores in colunas.items():
+            valor = documento.get(nome)
+            valores.append(str(valor) if isinstance(valor, ObjectId) else valor)
+        quantidade += 1
+        if quantidade == settings.EXPORT_LOTE:
+            yield pa.RecordBatch.from_pydict(colunas, schema=schema)
+            colunas = {nome: [] for nome in schema.names}
+            quantidade = 0
+    if quantidade:
+        yield pa.RecordBatch.from_pydict(colunas, schema=schema)
+
+
+def _gerar_arrow(modelo, preferencia):
+    schema = esquema(modelo)
+    destino = _Buffer()
+    with pa.ipc.new_stream(destino, schema) as writer:
+        for lote in _lotes(modelo, schema, preferencia):
+            writer.write_batch(lote)
+            yield destino.consumir()
+    yield destino.consumir()
+
+
+def _gerar_parquet(modelo, preferencia):
+    schema = esquema(modelo)
+    destino = _Buffer()
+    with pq.ParquetWriter(destino, schema, compression="zstd") as writer:
+        for lote in _lotes(modelo, schema, preferencia):
+            writer.write_batch(lote)  # um row group por lote
+            yield destino.consumir()
+    yield destino.consumir()
+
+
+def exportar(modelo, formato, nome_arquivo, preferencia=None):
+    """Resposta em streaming com a coleção inteira em Arrow IPC (stream) ou Parquet."""
+    if pa is None:
+        raise HTTPException(status_code=501, detail="Exportação colunar indisponível: instale o pacote pyarrow.")
+
+    gerador = _gerar_arrow(modelo, preferencia) if formato == "arrow" else _gerar_parquet(modelo, preferencia)
+    return StreamingResponse(
+        gerador,
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'},
+    )
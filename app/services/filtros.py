@@ -0,0 +1,176 @@
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from fastapi import HTTPException
+from config import settings
+
+
+class ConsultaCompilada:
+    """Consulta validada pronta para o MongoDB, compartilhada entre requests (não modificar)."""
+
+    def __init__(self, modelo, query, ordem, hint, intervalos, textos):
+        self.modelo = modelo
+        self.query = query
+        self.ordem = ordem
+        self.hint = hint
+        self.intervalos = intervalos
+        self.textos = textos
+
+    def queryset(self, preferencia, modelo=None):
+        """QuerySet da consulta; `modelo` permite aplicá-la a uma coleção com os mesmos campos e índices."""
+        queryset = (modelo or self.modelo).objects(__raw__=self.query).read_preference(preferencia)
+        if self.ordem:
+            queryset = queryset.order_by(self.ordem)
+        if self.hint:
+            queryset = queryset.hint(self.hint)
+        return queryset
+
+
+class EspecificacaoFiltro:
+    """Descrição declarativa dos filtros aceitos pelo `/filtrar` de um modelo.
+
+    - `texto`: campos com busca parcial sem diferenciar maiúsculas (parâmetro
+      com o nome do campo, ou um dict parâmetro -> campo);
+    - `intervalos`: campos numéricos, com parâmetros `<campo>_min` e `<campo>_max`;
+    - `datas`: campos de data, com parâmetros `<campo>_inicio` e `<campo>_fim`;
+    - `igualdades`: campos comparados por igualdade, com o parâmetro de mesmo nome;
+    - `ordenaveis`: únicos campos aceitos em `ordenacao`; cada um precisa de um
+      índice simples no modelo, usado como hint para evitar ordenação em memória.
+
+    Quando a coleção passa de `FILTRO_LIMITE_VARREDURA` documentos, são
+    recusadas as consultas só por texto (em modelos que também aceitam filtros
+    indexados) e as ordenações por um campo diferente dos filtrados, que não
+    usam o índice e ordenariam todo o resultado em memória.
+    """
+
+    def __init__(self, modelo, texto=(), intervalos=(), datas=(), igualdades=(), ordenaveis=()):
+        self.modelo = modelo
+        self.texto = texto if isinstance(texto, dict) else {campo: campo for campo in texto}
+        self.intervalos = list(intervalos)
+        self.datas = list(datas)
+        self.igualdades = list(igualdades)
+        self.ordenaveis = list(ordenaveis)
+        self.compilar_cache = lru_cache(maxsize=settings.FILTRO_CACHE)(self._compilar)
+        self._total_estimado = (0, 0.0)
+        self._lock = threading.Lock()
+
+    def compilar(self, ordenacao=None, ordem_ascendente=True, verificar=True, **parametros):
+        """Consulta compilada para os parâmetros; com `verificar=False`, a
+        verificação do plano fica para quem for executá-la no MongoDB (ver `verificar`)."""
+        chave = tuple(sorted((nome, valor) for nome, valor in parametros.items() if valor not in (None, "")))
+        consulta = self.compilar_cache(chave, ordenacao or None, ordem_ascendente)
+        if verificar:
+            self.verificar(consulta)
+        return consulta
+
+    def verificar(self, consulta):
+        """Recusa (400) planos que varreriam ou ordenariam em memória uma coleção grande."""
+        self._verificar_varredura(consulta)
+        self._verificar_ordenacao(consulta)
+
+    def _compilar(self, parametros, ordenacao, ordem_ascendente):
+        parametros = dict(parametros)
+        desconhecidos = set(parametros) - self._parametros()
+        if desconhecidos:
+            raise ValueError(f"Parâmetros de filtro desconhecidos: {sorted(desconhecidos)}")
+
+        query, intervalos, textos = {}, {}, []
+        for parametro, campo in self.texto.items():
+            if parametro in parametros:
+                query[campo] = {"$regex": re.escape(parametros[parametro]), "$options": "i"}
+                textos.append(campo)
+
+        for campo in self.intervalos:
+            minimo, maximo = parametros.get(f"{campo}_min"), parametros.get(f"{campo}_max")
+            self._intervalo(query, intervalos, campo, minimo, maximo)
+
+        for campo in self.igualdades:
+            if campo in parametros:
+                query[campo] = parametros[campo]
+
+        for campo in self.datas:
+            inicio = self._data(parametros.get(f"{campo}_inicio"), f"{campo}_inicio")
+            fim = self._data(parametros.get(f"{campo}_fim"), f"{campo}_fim")
+            self._intervalo(query, intervalos, campo, inicio, fim)
+
+        ordem = hint = None
+        if ordenacao:
+            if ordenacao not in self.ordenaveis:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Ordenação permitida apenas por: {', '.join(self.ordenaveis)}",
+                )
+            ordem = ("" if ordem_ascendente else "-") + ordenacao
+            # Sem filtros, ou com filtro no próprio campo, o índice da ordenação
+            # serve tanto para o filtro quanto para a ordem
+            if not query or set(query) == {ordenacao}:
+                hint = f"{ordenacao}_1"
+
+        return ConsultaCompilada(self.modelo, query, ordem, hint, intervalos, textos)
+
+    def _parametros(self):
+        return set(self.texto) | set(self._parametros_indexados())
+
+    @staticmethod
+    def _intervalo(query, intervalos, campo, minimo, maximo):
+        condicao = {}
+        if minimo is not None:
+            condicao["$gte"] = minimo
+        if maximo is not None:
+            condicao["$lte"] = maximo
+        if condicao:
+            query[campo] = condicao
+            intervalos[campo] = (minimo, maximo)
+
+    @staticmethod
+    def _data(valor, parametro):
+        if valor is None:
+            return None
+        try:
+            return datetime.fromisoformat(valor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Formato de data inválido em {parametro}. Use 'YYYY-MM-DDTHH:MM:SS'.")
+
+    def _verificar_varredura(self, consulta):
+        # Sem alternativa indexada na especificação, recusar só deixaria o
+        # modelo sem filtro algum
+        alternativas = self._parametros_indexados()
+        indexados = set(consulta.query) - set(consulta.textos)
+        if not alternativas or not consulta.query or indexados:
+            return
+        if self._total() > settings.FILTRO_LIMITE_VARREDURA:
+            raise HTTPException(
+                status_code=400,
+                detail="Filtros apenas por texto exigiriam varrer a coleção inteira; "
+                f"combine-os com um destes filtros: {', '.join(alternativas)}.",
+            )
+
+    def _verificar_ordenacao(self, consulta):
+        # Sem hint, a ordenação é por um campo diferente dos filtrados
+        if not consulta.ordem or consulta.hint:
+            return
+        if self._total() > settings.FILTRO_LIMITE_VARREDURA:
+            campo = consulta.ordem.lstrip("-")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Ordenar por '{campo}' com filtros em outros campos exigiria ordenar todo o resultado em memória; "
+                f"use a ordenação sem filtros ou filtrando só por '{campo}'.",
+            )
+
+    def _parametros_indexados(self):
+        return (
+            [f"{campo}_{sufixo}" for campo in self.intervalos for sufixo in ("min", "max")]
+            + [f"{campo}_{sufixo}" for campo in self.datas for sufixo in ("inicio", "fim")]
+            + self.igualdades
+        )
+
+    def _total(self):
+        """Tamanho estimado da coleção, renovado a cada minuto."""
+        with self._lock:
+            total, lido_em = self._total_estimado
+            if time.monotonic() - lido_em > 60:
+                total = self.modelo._get_collection().estimated_document_count()
+                self._total_estimado = (total, time.monotonic())
+            return total
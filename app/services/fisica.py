@@ -0,0 +1,155 @@
+import numpy as np
+from pymongo import UpdateOne
+from config import settings
+from models.estrela import Estrela
+from models.planeta import Planeta
+
+# Unidades assumidas no catálogo: distancia_da_estrela em UA, raio e massa do
+# planeta em raios/massas terrestres, luminosidade em luminosidades solares e
+# temperatura da estrela em K.
+TEMPERATURA_EQUILIBRIO_1UA = 278.6  # K, corpo negro a 1 UA do Sol
+DENSIDADE_TERRA = 5.514  # g/cm³
+GRAVIDADE_TERRA = 9.807  # m/s²
+TEMPERATURA_SOL = 5780.0  # K
+
+# Kopparapu et al. (2013): fluxo efetivo nos limites conservadores da zona
+# habitável (estufa úmida na borda interna, estufa máxima na externa), em
+# função de Teff - 5780 K
+COEFICIENTES_ZONA = {
+    "interna": (1.0140, 8.1774e-5, 1.7063e-9, -4.3241e-12, -6.6462e-16),
+    "externa": (0.3438, 5.8942e-5, 1.6558e-9, -3.0045e-12, -5.2983e-16),
+}
+
+CAMPOS_DERIVADOS = ["temperatura_equilibrio", "densidade", "gravidade_superficial", "fluxo_estelar", "zona_habitavel"]
+
+
+def _fluxo_efetivo(coeficientes, temperatura):
+    s, a, b, c, d = coeficientes
+    t = np.clip(temperatura, 2600.0, 7200.0) - TEMPERATURA_SOL
+    return s + a * t + b * t**2 + c * t**3 + d * t**4
+
+
+def calcular_derivados(distancia, raio, massa, luminosidade, temperatura, albedo=0.3):
+    """Grandezas derivadas para arrays de pares planeta-estrela (NaN onde faltam dados).
+
+    Devolve um dict com arrays de temperatura de equilíbrio (K), densidade
+    (g/cm³), gravidade superficial (m/s²), fluxo estelar (em fluxos
+    terrestres) e pertencimento à zona habitável conservadora (1.0/0.0).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fluxo = luminosidade / distancia**2
+        temperatura_equilibrio = TEMPERATURA_EQUILIBRIO_1UA * (1 - albedo) ** 0.25 * fluxo**0.25
+        densidade = DENSIDADE_TERRA * massa / raio**3
+        gravidade = GRAVIDADE_TERRA * massa / raio**2
+
+        temperatura = np.where(np.isnan(temperatura), TEMPERATURA_SOL, temperatura)
+        limite_interno = np.sqrt(luminosidade / _fluxo_efetivo(COEFICIENTES_ZONA["interna"], temperatura))
+        limite_externo = np.sqrt(luminosidade / _fluxo_efetivo(COEFICIENTES_ZONA["externa"], temperatura))
+        zona = np.where(
+            np.isnan(distancia) | np.isnan(luminosidade),
+            np.nan,
+            (distancia >= limite_interno) & (distancia <= limite_externo),
+        )
+
+    return {
+        "temperatura_equilibrio": temperatura_equilibrio,
+        "densidade": densidade,
+        "gravidade_superficial": gravidade,
+        "fluxo_estelar": fluxo,
+        "zona_habitavel": zona,
+    }
+
+
+def _coluna(documentos, campo):
+    return np.array([documento.get(campo) for documento in documentos], dtype=np.float64)
+
+
+def _valores(derivados, i):
+    """Campos derivados calculados para o i-ésimo planeta (os sem dados ficam de fora)."""
+    valores = {}
+    for campo in CAMPOS_DERIVADOS:
+        valor = derivados[campo][i]
+        if np.isfinite(valor):
+            valores[campo] = bool(valor) if campo == "zona_habitavel" else float(valor)
+    return valores
+
+
+def preencher_derivados(planeta):
+    """Preenche os campos derivados de um planeta antes de gravá-lo, com uma consulta à estrela."""
+    documento = planeta.to_mongo()
+    estrela = {}
+    if documento.get("estrela"):
+        estrela = Estrela._get_collection().find_one({"_id": documento["estrela"]}, {"luminosidade": 1, "temperatura": 1}) or {}
+    derivados = calcular_derivados(
+        _coluna([documento], "distancia_da_estrela"),
+        _coluna([documento], "raio"),
+        _coluna([documento], "massa"),
+        _coluna([estrela], "luminosidade"),
+        _coluna([estrela], "temperatura"),
+    )
+    valores = _valores(derivados, 0)
+    for campo in CAMPOS_DERIVADOS:
+        setattr(planeta, campo, valores.get(campo))
+
+
+def atualizar_derivados(filtro=None, tarefa=None):
+    """Recalcula e grava os campos derivados dos planetas que atendem `filtro`.
+
+    Planetas e estrelas são lidos em lotes de `DERIVADOS_LOTE`, o cálculo é
+    vetorizado por lote e a gravação usa um único bulk_write por lote.
+    """
+    colecao = Planeta._get_collection()
+    estrelas = Estrela._get_collection()
+    projecao = {"_id": 1, "estrela": 1, "distancia_da_estrela": 1, "raio": 1, "massa": 1}
+    cursor = colecao.find(filtro or {}, projecao, batch_size=settings.DERIVADOS_LOTE)
+
+    processados = 0
+    lote = []
+    for planeta in cursor:
+        lote.append(planeta)
+        if len(lote) == settings.DERIVADOS_LOTE:
+            processados += _atualizar_lote(colecao, estrelas, lote)
+            lote = []
+            if tarefa is not None:
+                tarefa.progresso["planetas"] = processados
+    if lote:
+        processados += _atualizar_lote(colecao, estrelas, lote)
+    if tarefa is not None:
+        tarefa.progresso["planetas"] = processados
+    return processados
+
+
+def _atualizar_lote(colecao, estrelas, planetas):
+    ids_estrelas = list({planeta["estrela"] for planeta in planetas if planeta.get("estrela")})
+    hospedeiras = {
+        estrela["_id"]: estrela
+        for estrela in estrelas.find({"_id": {"$in": ids_estrelas}}, {"luminosidade": 1, "temperatura": 1})
+    }
+    pares = [hospedeiras.get(planeta.get("estrela"), {}) for planeta in planetas]
+
+    derivados = calcular_derivados(
+        _coluna(planetas, "distancia_da_estrela"),
+        _coluna(planetas, "raio"),
+        _coluna(planetas, "massa"),
+        _coluna(pares, "luminosidade"),
+        _coluna(pares, "temperatura"),
+    )
+
+    operacoes = []
+    for i, planeta in enumerate(planetas):
+        valores = _valores(derivados, i)
+        ausentes = {campo: "" for campo in CAMPOS_DERIVADOS if campo not in valores}
+        atualizacao = {}
+        if valores:
+            atualizacao["$set"] = valores
+        if ausentes:
+            atualizacao["$unset"] = ausentes
+        operacoes.append(UpdateOne({"_id": planeta["_id"]}, atualizacao))
+
+    colecao.bulk_write(operacoes, ordered=False)
+    return len(operacoes)
+
+
+def recalcular_planetas(tarefa, filtro=None):
+    """Versão para a fila de tarefas."""
+    atualizar_derivados(filtro, tarefa)
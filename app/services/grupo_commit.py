@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+from bson import ObjectId
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, OperationFailure
+from config import settings
+
+
+def _write_concern():
+    w = settings.GRUPO_COMMIT_W
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=settings.GRUPO_COMMIT_J)
+
+
+class BufferEscrita:
+    """Buffer de inserções de uma coleção, gravado como um único insert_many.
+
+    O lote é gravado quando junta `GRUPO_COMMIT_MAXIMO` documentos ou
+    `GRUPO_COMMIT_INTERVALO_MS` depois do primeiro, com o write concern
+    configurado. Cada `inserir` só retorna quando o seu lote foi confirmado.
+    """
+
+    def __init__(self, modelo):
+        self.modelo = modelo
+        self._pendentes = []
+        self._agendamento = None
+        self.lotes = 0
+        self.documentos = 0
+        self.maior_lote = 0
+        self.falhas = 0
+
+    async def inserir(self, documento):
+        documento.validate()
+        if documento.pk is None:
+            documento.pk = ObjectId()
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendentes.append((documento.to_mongo(), futuro))
+        if len(self._pendentes) >= settings.GRUPO_COMMIT_MAXIMO:
+            self._descarregar()
+        elif self._agendamento is None:
+            self._agendamento = loop.call_later(settings.GRUPO_COMMIT_INTERVALO_MS / 1000, self._descarregar)
+        await futuro
+
+    def _descarregar(self):
+        if self._agendamento is not None:
+            self._agendamento.cancel()
+            self._agendamento = None
+        lote, self._pendentes = self._pendentes, []
+        if lote:
+            # Contexto vazio: o prazo (pymongo.timeout) da requisição que fechou
+            # o lote não deve valer para a gravação das demais
+            asyncio.get_running_loop().create_task(self._gravar(lote), context=contextvars.Context())
+
+    async def _gravar(self, lote):
+        colecao = self.modelo._get_collection().with_options(write_concern=_write_concern())
+        self.lotes += 1
+        self.documentos += len(lote)
+        self.maior_lote = max(self.maior_lote, len(lote))
+
+        falhas = {}
+        try:
+            await asyncio.to_thread(colecao.insert_many, [documento for documento, _ in lote], ordered=False)
+        except BulkWriteError as erro:
+            if erro.details.get("writeConcernErrors"):
+                self._falhar(lote, erro)
+                return
+            falhas = {falha["index"]: falha for falha in erro.details["writeErrors"]}
+        except Exception as erro:
+            self._falhar(lote, erro)
+            return
+
+        self.falhas += len(falhas)
+        for indice, (_, futuro) in enumerate(lote):
+            if futuro.done():
+                continue  # cliente desconectou
+            if indice in falhas:
+                futuro.set_exception(OperationFailure(falhas[indice]["errmsg"], falhas[indice]["code"]))
+            else:
+                futuro.set_result(None)
+
+    def _falhar(self, lote, erro):
+        self.falhas += len(lote)
+        for _, futuro in lote:
+            if not futuro.done():
+                futuro.set_exception(erro)
+
+    def metricas(self):
+        return {
+            "pendentes": len(self._pendentes),
+            "lotes": self.lotes,
+            "documentos": self.documentos,
+            "media_por_lote": round(self.documentos / self.lotes, 2) if self.lotes else 0,
+            "maior_lote": self.maior_lote,
+            "falhas": self.falhas,
+        }
+
+
+buffers = {}
+
+
+def buffer_para(modelo):
+    if modelo not in buffers:
+        buffers[modelo] = BufferEscrita(modelo)
+    return buffers[modelo]
+
+
+async def gravar(documento):
+    """Grava um documento novo: agrupado com outros se `GRUPO_COMMIT` estiver ativo, senão com save()."""
+    if not settings.GRUPO_COMMIT:
+        documento.save()
+        return
+    await buffer_para(type(documento)).inserir(documento)
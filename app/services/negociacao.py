@@ -0,0 +1,153 @@
+import gzip
+from contextvars import ContextVar
+import bson
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Formatos de resposta disponíveis, na ordem de preferência do servidor
+FORMATOS = {"application/json": "application/json", "application/bson": "application/bson"}
+if msgpack is not None:
+    FORMATOS["application/msgpack"] = "application/msgpack"
+    FORMATOS["application/x-msgpack"] = "application/msgpack"
+
+CODIFICACOES = {}
+if zstandard is not None:
+    CODIFICACOES["zstd"] = lambda corpo: zstandard.ZstdCompressor(level=3).compress(corpo)
+if brotli is not None:
+    CODIFICACOES["br"] = lambda corpo: brotli.compress(corpo, quality=4)
+CODIFICACOES["gzip"] = lambda corpo: gzip.compress(corpo, compresslevel=6)
+
+formato_resposta = ContextVar("formato_resposta", default="application/json")
+
+
+def negociar(cabecalho, opcoes):
+    """Escolhe, entre `opcoes`, o valor aceito com maior `q` no cabeçalho (ou None)."""
+    aceitos = {}
+    for item in cabecalho.split(","):
+        valor, *parametros = [parte.strip() for parte in item.split(";")]
+        q = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    q = float(parametro[2:])
+                except ValueError:
+                    q = 0.0
+        if valor:
+            aceitos[valor.lower()] = q
+
+    melhor, melhor_q = None, 0.0
+    for opcao in opcoes:
+        q = aceitos.get(opcao, 0.0)
+        if q > melhor_q:
+            melhor, melhor_q = opcao, q
+    return melhor
+
+
+class RespostaNegociada(JSONResponse):
+    """Resposta padrão da API: JSON, MessagePack ou BSON conforme o `Accept` do request.
+
+    MessagePack e BSON são codificados direto do dicionário devolvido pelo
+    handler, sem passar por JSON.
+    """
+
+    def __init__(self, content=None, status_code=200, headers=None, media_type=None, background=None):
+        self.media_type = formato_resposta.get()
+        super().__init__(content, status_code, headers, media_type, background)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content):
+        if self.media_type == "application/bson":
+            return bson.encode(content if isinstance(content, dict) else {"data": content})
+        if self.media_type == "application/msgpack":
+            return msgpack.packb(content, default=str)
+        if orjson is not None:
+            return orjson.dumps(content)
+        return super().render(content)
+
+
+class NegociacaoMiddleware:
+    """Define o formato da resposta e comprime o corpo conforme `Accept-Encoding`.
+
+    Só comprime respostas completas (não streaming) com pelo menos
+    `COMPRESSAO_MIN_BYTES`; SSE, exports e respostas já codificadas passam direto.
+    """
+
+    def __init__(self, app, tamanho_minimo=None):
+        self.app = app
+        self.tamanho_minimo = settings.COMPRESSAO_MIN_BYTES if tamanho_minimo is None else tamanho_minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        formato = FORMATOS.get(negociar(headers.get("accept", ""), list(FORMATOS)), "application/json")
+        token = formato_resposta.set(formato)
+        codificacao = negociar(headers.get("accept-encoding", ""), list(CODIFICACOES))
+        try:
+            if codificacao is None:
+                await self.app(scope, receive, send)
+            else:
+                await self.app(scope, receive, self._compressor(send, codificacao))
+        finally:
+            formato_resposta.reset(token)
+
+    def _compressor(self, send, codificacao):
+        inicio = None
+
+        async def enviar(mensagem):
+            nonlocal inicio
+            if mensagem["type"] == "http.response.start":
+                headers = Headers(raw=mensagem.get("headers", []))
+                # Respostas que nunca serão comprimidas saem sem esperar o
+                # corpo; um SSE só teria cabeçalhos no primeiro evento
+                if "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream"):
+                    await send(mensagem)
+                else:
+                    inicio = mensagem
+                return
+            if mensagem["type"] != "http.response.body" or inicio is None:
+                await send(mensagem)
+                return
+
+            inicio_resposta, inicio = inicio, None
+            headers = MutableHeaders(raw=list(inicio_resposta["headers"]))
+            corpo = mensagem.get("body", b"")
+            comprimir = (
+                not mensagem.get("more_body", False)
+                and len(corpo) >= self.tamanho_minimo
+                and "content-encoding" not in headers
+            )
+            if comprimir:
+                corpo = CODIFICACOES[codificacao](corpo)
+                headers["Content-Encoding"] = codificacao
+                headers["Content-Length"] = str(len(corpo))
+                headers.add_vary_header("Accept-Encoding")
+                inicio_resposta = {**inicio_resposta, "headers": headers.raw}
+                mensagem = {**mensagem, "body": corpo}
+            await send(inicio_resposta)
+            await send(mensagem)
+
+        return enviar
@@ -0,0 +1,90 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import settings
+from models.estrela import Estrela
+from models.exoplaneta import Exoplaneta
+from models.observacao import Observacao
+from models.planeta import Planeta
+
+# Coleções do catálogo a que `Observacao.objeto_id` pode se referir, na ordem
+# em que são consultadas quando o mesmo nome existe em mais de uma
+CATALOGO = {"estrela": Estrela, "planeta": Planeta, "exoplaneta": Exoplaneta}
+
+
+def resolver(valores):
+    """Resolve valores de `objeto_id` (id ou nome) para `(tipo, ObjectId)`.
+
+    Faz uma consulta por coleção para todos os ids e outra para todos os nomes
+    do lote. Valores que não correspondem a nenhum objeto ficam de fora.
+    """
+    valores = {valor for valor in valores if valor}
+    ids = [ObjectId(valor) for valor in valores if ObjectId.is_valid(valor)]
+    nomes = list(valores)
+    resolvidos = {}
+
+    for tipo, modelo in CATALOGO.items():
+        colecao = modelo._get_collection()
+        if ids:
+            for documento in colecao.find({"_id": {"$in": ids}}, {"_id": 1}):
+                resolvidos.setdefault(str(documento["_id"]), (tipo, documento["_id"]))
+        for documento in colecao.find({"nome": {"$in": nomes}}, {"_id": 1, "nome": 1}):
+            resolvidos.setdefault(documento["nome"], (tipo, documento["_id"]))
+    return resolvidos
+
+
+def vincular(data):
+    """Preenche `objeto_tipo` e `objeto_ref` em `data` a partir de `objeto_id`, se presente."""
+    if "objeto_id" not in data:
+        return data
+    tipo, ref = resolver([data["objeto_id"]]).get(data["objeto_id"], (None, None))
+    data["objeto_tipo"] = tipo
+    data["objeto_ref"] = ref
+    return data
+
+
+def resolver_observacoes(tarefa, todas=False):
+    """Vincula ao catálogo as observações com `objeto_id`, em lotes de `OBJETOS_LOTE`.
+
+    Por padrão só processa as que ainda não têm `objeto_ref`; com `todas`,
+    refaz o vínculo de todas (por exemplo, depois de importar o catálogo).
+    """
+    colecao = Observacao._get_collection()
+    filtro = {"objeto_id": {"$nin": [None, ""]}}
+    if not todas:
+        filtro["objeto_ref"] = None
+    cursor = colecao.find(filtro, {"_id": 1, "objeto_id": 1}, batch_size=settings.OBJETOS_LOTE)
+
+    lote = []
+    for observacao in cursor:
+        lote.append(observacao)
+        if len(lote) == settings.OBJETOS_LOTE:
+            _vincular_lote(tarefa, colecao, lote)
+            lote = []
+    if lote:
+        _vincular_lote(tarefa, colecao, lote)
+
+
+def _vincular_lote(tarefa, colecao, observacoes):
+    resolvidos = resolver(observacao["objeto_id"] for observacao in observacoes)
+    operacoes = []
+    for observacao in observacoes:
+        resolvido = resolvidos.get(observacao["objeto_id"])
+        if resolvido:
+            operacoes.append(UpdateOne(
+                {"_id": observacao["_id"]},
+                {"$set": {"objeto_tipo": resolvido[0], "objeto_ref": resolvido[1]}},
+            ))
+    if operacoes:
+        colecao.bulk_write(operacoes, ordered=False)
+
+    tarefa.progresso["processadas"] = tarefa.progresso.get("processadas", 0) + len(observacoes)
+    tarefa.progresso["vinculadas"] = tarefa.progresso.get("vinculadas", 0) + len(operacoes)
+
+
+def observacoes_do_objeto(tipo, objeto_id, preferencia):
+    """Observações de um objeto do catálogo, mais recentes primeiro (índice `objeto_tipo, objeto_ref, datahora`)."""
+    return (
+        Observacao.objects(objeto_tipo=tipo, objeto_ref=ObjectId(objeto_id))
+        .read_preference(preferencia)
+        .order_by("-datahora")
+    )
@@ -0,0 +1,243 @@
+import re
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config import settings
+from models.estrela import Estrela
+from services.change_stream import hub_para
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+CAMPOS = ["temperatura", "luminosidade", "magnitude", "tipo_espectral"]
+
+# Classe espectral -> posição na sequência; o subtipo (0-9) entra como fração da classe
+CLASSES_ESPECTRAIS = "OBAFGKMLTY"
+_TIPO_ESPECTRAL = re.compile(r"([OBAFGKMLTY])\s*(\d+(?:\.\d+)?)?")
+
+
+def _tipo_espectral(valor):
+    encontrado = _TIPO_ESPECTRAL.match((valor or "").strip().upper())
+    if not encontrado:
+        return np.nan
+    subtipo = float(encontrado.group(2)) if encontrado.group(2) else 5.0
+    return CLASSES_ESPECTRAIS.index(encontrado.group(1)) * 10 + min(subtipo, 9.9)
+
+
+def _id(valor):
+    # Arrays "S12" descartam bytes nulos no fim ao devolver um elemento
+    return bytes(valor).ljust(12, b"\0")
+
+
+def _vetor(documento):
+    """Parâmetros brutos da estrela (NaN para ausentes); a luminosidade entra em log10."""
+    luminosidade = documento.get("luminosidade")
+    return [
+        np.nan if documento.get("temperatura") is None else float(documento["temperatura"]),
+        np.log10(luminosidade) if luminosidade and luminosidade > 0 else np.nan,
+        np.nan if documento.get("magnitude") is None else float(documento["magnitude"]),
+        _tipo_espectral(documento.get("tipo_espectral")),
+    ]
+
+
+class IndiceSimilares:
+    """Índice k-NN das estrelas sobre temperatura, luminosidade, magnitude e tipo espectral.
+
+    Os parâmetros são normalizados (z-score, com ausentes na média) e indexados
+    numa KD-tree (scipy), ou comparados por força bruta vetorizada sem scipy.
+    Alterações recebidas pelo change stream ficam num conjunto delta, comparado
+    por força bruta, e a árvore é reconstruída em segundo plano quando o delta
+    passa de `SIMILARES_DELTA_MAXIMO`. Sem change stream (MongoDB fora de
+    replica set), o índice é relido a cada `SIMILARES_RECARGA_SECONDS`.
+    """
+
+    def __init__(self):
+        self.pronto = False
+        self._lock = threading.RLock()
+        self._ids = np.empty(0, dtype="S12")
+        self._brutos = np.empty((0, len(CAMPOS)))
+        self._ativos = np.empty(0, dtype=bool)
+        self._posicoes = {}
+        self._delta = {}
+        self._media = np.zeros(len(CAMPOS))
+        self._desvio = np.ones(len(CAMPOS))
+        self._arvore = None
+        self._pontos = np.empty((0, len(CAMPOS)))
+        self._eventos_reconstrucao = None
+        self.change_stream = None
+        self.atualizado_em = None
+
+    def carregar(self):
+        # Eventos recebidos durante a leitura são guardados e reaplicados sobre
+        # o índice construído, como na reconstrução; reaplicar um evento já
+        # refletido na leitura não muda o resultado.
+        with self._lock:
+            self._eventos_reconstrucao = []
+        hub = hub_para(Estrela)
+        hub.adicionar_ouvinte(self._aplicar)
+        self.change_stream = hub.suportado
+        self._trocar(self._construir(*self._ler()))
+        if not self.change_stream:
+            print(f"❌ Change streams não suportados: o índice de similares será relido a cada {settings.SIMILARES_RECARGA_SECONDS}s")
+            self._recarregar_periodicamente()
+
+    @staticmethod
+    def _ler():
+        projecao = {campo: 1 for campo in CAMPOS}
+        ids, brutos = [], []
+        for documento in Estrela._get_collection().find({}, projecao, batch_size=10000):
+            ids.append(documento["_id"].binary)
+            brutos.append(_vetor(documento))
+        return ids, brutos
+
+    def _recarregar_periodicamente(self):
+        while True:
+            time.sleep(settings.SIMILARES_RECARGA_SECONDS)
+            with self._lock:
+                self._eventos_reconstrucao = []
+            try:
+                self._trocar(self._construir(*self._ler()))
+            except PyMongoError as e:
+                print("❌ Erro ao reler o índice de estrelas similares:", e)
+                with self._lock:
+                    self._eventos_reconstrucao = None
+
+    @staticmethod
+    def _construir(ids, brutos):
+        brutos = np.array(brutos, dtype=np.float64).reshape(len(ids), len(CAMPOS))
+        with np.errstate(invalid="ignore"):
+            media = np.nan_to_num(np.nanmean(brutos, axis=0)) if len(ids) else np.zeros(len(CAMPOS))
+            desvio = np.nan_to_num(np.nanstd(brutos, axis=0)) if len(ids) else np.ones(len(CAMPOS))
+        desvio[desvio == 0] = 1.0
+        pontos = np.nan_to_num((brutos - media) / desvio)
+        arvore = cKDTree(pontos) if cKDTree is not None and len(ids) else None
+        return np.array(ids, dtype="S12"), brutos, media, desvio, pontos, arvore
+
+    def _instalar(self, ids, brutos, media, desvio, pontos, arvore):
+        self._ids, self._brutos, self._pontos, self._arvore = ids, brutos, pontos, arvore
+        self._media, self._desvio = media, desvio
+        self._ativos = np.ones(len(ids), dtype=bool)
+        self._posicoes = {_id(id_): posicao for posicao, id_ in enumerate(ids)}
+
+    def _aplicar(self, evento):
+        id_ = ObjectId(evento["documento_id"]).binary
+        documento = evento["documento"]
+        with self._lock:
+            if self._eventos_reconstrucao is not None:
+                self._eventos_reconstrucao.append(evento)
+            posicao = self._posicoes.get(id_)
+            if posicao is not None:
+                self._ativos[posicao] = False
+            if evento["operacao"] == "delete" or documento is None:
+                self._delta.pop(id_, None)
+            else:
+                self._delta[id_] = np.array(_vetor(documento), dtype=np.float64)
+            reconstruir = (
+                self.pronto
+                and self._eventos_reconstrucao is None
+                and len(self._delta) > settings.SIMILARES_DELTA_MAXIMO
+            )
+        if reconstruir:
+            threading.Thread(target=self._reconstruir, name="similares-reconstrucao", daemon=True).start()
+
+    def _reconstruir(self):
+        """Reconstrói a árvore sem bloquear consultas; eventos recebidos no meio são reaplicados."""
+        with self._lock:
+            if self._eventos_reconstrucao is not None:
+                return
+            self._eventos_reconstrucao = []
+            ids = [_id(id_) for id_ in self._ids[self._ativos]] + list(self._delta)
+            brutos = np.vstack([self._brutos[self._ativos]] + list(self._delta.values()))
+        self._trocar(self._construir(ids, brutos))
+
+    def _trocar(self, construido):
+        """Instala o índice construído e reaplica os eventos recebidos enquanto era construído."""
+        with self._lock:
+            eventos, self._eventos_reconstrucao = self._eventos_reconstrucao, None
+            self._delta = {}
+            self._instalar(*construido)
+            self.pronto = True
+            self.atualizado_em = datetime.utcnow()
+            for evento in eventos:
+                self._aplicar(evento)
+
+    def _normalizar(self, brutos):
+        return np.nan_to_num((brutos - self._media) / self._desvio)
+
+    def vizinhos(self, estrela_id, k):
+        """Os `k` ids mais próximos de `estrela_id`, com as distâncias no espaço normalizado.
+
+        Devolve None se a estrela não existir.
+        """
+        id_ = ObjectId(estrela_id).binary
+        with self._lock:
+            bruto = self._delta.get(id_)
+            posicao = self._posicoes.get(id_)
+            if bruto is None and posicao is not None and self._ativos[posicao]:
+                bruto = self._brutos[posicao]
+        if bruto is None:
+            # Estrela ainda não recebida pelo change stream: lida fora do lock
+            documento = Estrela._get_collection().find_one({"_id": ObjectId(estrela_id)}, {campo: 1 for campo in CAMPOS})
+            if documento is None:
+                return None
+            bruto = np.array(_vetor(documento), dtype=np.float64)
+
+        with self._lock:
+            ponto = self._normalizar(bruto)
+
+            candidatos = self._base(ponto, k + 1) + self._delta_proximos(ponto, k + 1)
+        candidatos = sorted((distancia, candidato) for distancia, candidato in candidatos if candidato != id_)
+        return [(ObjectId(candidato), float(distancia)) for distancia, candidato in candidatos[:k]]
+
+    def _base(self, ponto, k):
+        total = len(self._ids)
+        if not total:
+            return []
+        if self._arvore is None:
+            distancias = np.linalg.norm(self._pontos - ponto, axis=1)
+            distancias[~self._ativos] = np.inf
+            indices = np.argpartition(distancias, min(k, total) - 1)[:k] if k < total else np.arange(total)
+            return [(distancias[i], _id(self._ids[i])) for i in indices if np.isfinite(distancias[i])]
+
+        # Estrelas alteradas continuam na árvore até a reconstrução; a busca
+        # pede mais vizinhos até encontrar `k` ativos
+        busca = k
+        while True:
+            distancias, indices = self._arvore.query(ponto, k=min(busca, total))
+            distancias, indices = np.atleast_1d(distancias), np.atleast_1d(indices)
+            encontrados = [(distancias[j], _id(self._ids[i])) for j, i in enumerate(indices) if self._ativos[i]]
+            if len(encontrados) >= k or busca >= total:
+                return encontrados[:k]
+            busca *= 2
+
+    def _delta_proximos(self, ponto, k):
+        if not self._delta:
+            return []
+        ids = list(self._delta)
+        distancias = np.linalg.norm(self._normalizar(np.vstack(list(self._delta.values()))) - ponto, axis=1)
+        return sorted(zip(distancias.tolist(), ids))[:k]
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "pronto": self.pronto,
+                "estrelas": int(self._ativos.sum()) + len(self._delta),
+                "delta": len(self._delta),
+                "kdtree": self._arvore is not None,
+                # False: sem change stream, alterações só entram na próxima releitura
+                "change_stream": self.change_stream,
+                "atualizado_em": self.atualizado_em,
+            }
+
+
+indice_similares = IndiceSimilares()
+
+
+def iniciar_similares():
+    if settings.SIMILARES:
+        threading.Thread(target=indice_similares.carregar, name="similares", daemon=True).start()
@@ -0,0 +1,63 @@
+import asyncio
+import functools
+from fastapi.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """Agrupa chamadas idênticas em andamento numa única execução.
+
+    Enquanto a primeira chamada para uma chave está executando no threadpool,
+    as demais aguardam a mesma tarefa no loop de eventos, sem ocupar threads,
+    e recebem o mesmo resultado (ou a mesma exceção). O resultado é
+    compartilhado entre os requests e não deve ser modificado.
+    """
+
+    def __init__(self):
+        # Só acessado a partir do loop de eventos, por isso dispensa lock
+        self._em_andamento = {}
+        self.executadas = 0
+        self.agrupadas = 0
+
+    async def executar(self, chave, funcao):
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(run_in_threadpool(funcao))
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(functools.partial(self._concluir, chave))
+            self.executadas += 1
+        else:
+            self.agrupadas += 1
+        # shield: um request cancelado (cliente desconectou) não cancela a
+        # consulta que os outros estão aguardando
+        return await asyncio.shield(tarefa)
+
+    def _concluir(self, chave, tarefa):
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
+        if not tarefa.cancelled():
+            tarefa.exception()  # marca a exceção como tratada mesmo sem ninguém aguardando
+
+    def metricas(self):
+        return {
+            "executadas": self.executadas,
+            "agrupadas": self.agrupadas,
+            "em_andamento": len(self._em_andamento),
+        }
+
+
+single_flight = SingleFlight()
+
+
+def coalescer(funcao):
+    """Decorator para handlers de leitura síncronos.
+
+    O handler passa a ser assíncrono: a primeira chamada para uma chave roda a
+    função no threadpool e as concorrentes aguardam o mesmo resultado. A chave
+    é a rota mais os parâmetros recebidos, de modo que requests concorrentes
+    com os mesmos parâmetros executam a consulta uma única vez.
+    """
+    @functools.wraps(funcao)
+    async def wrapper(**kwargs):
+        chave = (funcao, tuple(sorted(kwargs.items())))
+        return await single_flight.executar(chave, functools.partial(funcao, **kwargs))
+    return wrapper
@@ -0,0 +1,168 @@
+import sys
+import threading
+from datetime import datetime
+import numpy as np
+from bson import ObjectId
+from config import settings
+from models.estrela import Estrela
+from models.planeta import Planeta
+from services.change_stream import hub_para
+
+
+def _numero(valor):
+    if valor is None:
+        return np.nan
+    if isinstance(valor, datetime):
+        return valor.timestamp() * 1000
+    return float(valor)
+
+
+def _object_id(valor):
+    # Arrays "S12" descartam bytes nulos no fim ao devolver um elemento; sem
+    # completar os 12 bytes, cerca de 1 em 256 ids seria recusado pelo ObjectId
+    return ObjectId(bytes(valor).ljust(12, b"\0"))
+
+
+class SnapshotColunar:
+    """Cópia em memória dos campos numéricos de uma coleção, em arrays NumPy.
+
+    Guarda um array de ids (ObjectId em 12 bytes), um float64 por campo (NaN
+    para ausentes, datas em ms) e uma máscara de documentos ativos. É mantido
+    atualizado pelo change stream da coleção; inserções ficam pendentes e são
+    anexadas aos arrays na próxima consulta.
+    """
+
+    def __init__(self, modelo, campos):
+        self.modelo = modelo
+        self.campos = campos
+        self.pronto = False
+        self._lock = threading.RLock()
+        self._ids = np.empty(0, dtype="S12")
+        self._colunas = {campo: np.empty(0) for campo in campos}
+        self._ativos = np.empty(0, dtype=bool)
+        self._posicoes = {}
+        self._pendentes = {}
+
+    def carregar(self):
+        # O ouvinte é registrado antes da leitura para não perder alterações
+        # feitas durante a carga; aplicar um evento duas vezes não tem efeito.
+        hub = hub_para(self.modelo)
+        hub.adicionar_ouvinte(self._aplicar)
+        if not hub.suportado:
+            # Sem change stream o snapshot nunca seria atualizado: os filtros
+            # continuam indo ao MongoDB
+            print(f"❌ Snapshot colunar de {self.modelo.__name__} desativado: change streams não suportados")
+            return
+        with self._lock:
+            projecao = {campo: 1 for campo in self.campos}
+            ids, valores = [], {campo: [] for campo in self.campos}
+            for documento in self.modelo._get_collection().find({}, projecao, batch_size=10000):
+                ids.append(documento["_id"].binary)
+                for campo in self.campos:
+                    valores[campo].append(_numero(documento.get(campo)))
+
+            self._ids = np.array(ids, dtype="S12")
+            self._colunas = {campo: np.array(valores[campo], dtype=np.float64) for campo in self.campos}
+            self._ativos = np.ones(len(ids), dtype=bool)
+            self._posicoes = {id_: posicao for posicao, id_ in enumerate(ids)}
+            self._pendentes = {}
+            self.pronto = True
+
+    def _aplicar(self, evento):
+        id_ = ObjectId(evento["documento_id"]).binary
+        documento = evento["documento"]
+        with self._lock:
+            posicao = self._posicoes.get(id_)
+            if evento["operacao"] == "delete" or documento is None:
+                if posicao is not None:
+                    self._ativos[posicao] = False
+                self._pendentes.pop(id_, None)
+            elif posicao is not None:
+                for campo in self.campos:
+                    self._colunas[campo][posicao] = _numero(documento.get(campo))
+                self._ativos[posicao] = True
+            else:
+                self._pendentes[id_] = [_numero(documento.get(campo)) for campo in self.campos]
+
+    def _consolidar(self):
+        if not self._pendentes:
+            return
+        inicio = len(self._ids)
+        novos = list(self._pendentes)
+        valores = np.array(list(self._pendentes.values()), dtype=np.float64).reshape(len(novos), len(self.campos))
+        self._ids = np.concatenate([self._ids, np.array(novos, dtype="S12")])
+        for i, campo in enumerate(self.campos):
+            self._colunas[campo] = np.concatenate([self._colunas[campo], valores[:, i]])
+        self._ativos = np.concatenate([self._ativos, np.ones(len(novos), dtype=bool)])
+        self._posicoes.update({id_: inicio + i for i, id_ in enumerate(novos)})
+        self._pendentes = {}
+
+    def suporta(self, campos_filtrados, ordenacao):
+        return self.pronto and set(campos_filtrados) <= set(self.campos) and (not ordenacao or ordenacao in self.campos)
+
+    def filtrar(self, intervalos, ordenacao=None, ascendente=True, skip=0, limit=10):
+        """Aplica os intervalos `{campo: (minimo, maximo)}` e devolve (total, ids da página).
+
+        Documentos sem o campo não satisfazem o intervalo (como no MongoDB), e
+        na ordenação ficam antes dos demais na ordem ascendente e depois na descendente.
+        """
+        with self._lock:
+            self._consolidar()
+            mascara = self._ativos.copy()
+            for campo, (minimo, maximo) in intervalos.items():
+                coluna = self._colunas[campo]
+                if minimo is not None:
+                    mascara &= coluna >= _numero(minimo)
+                if maximo is not None:
+                    mascara &= coluna <= _numero(maximo)
+
+            indices = np.flatnonzero(mascara)
+            total = len(indices)
+            fim = min(skip + limit, total)
+            if ordenacao and skip < total:
+                chave = np.nan_to_num(self._colunas[ordenacao][indices], nan=-np.inf)
+                if not ascendente:
+                    chave = -chave
+                if fim < total:
+                    # Só os primeiros `fim` precisam de ordenação completa
+                    candidatos = np.argpartition(chave, fim - 1)[:fim]
+                    indices = indices[candidatos[np.argsort(chave[candidatos], kind="stable")]]
+                else:
+                    indices = indices[np.argsort(chave, kind="stable")]
+
+            return total, [_object_id(id_) for id_ in self._ids[indices[skip:fim]]]
+
+    def buscar(self, ids):
+        """Busca os documentos da página, preservando a ordem calculada."""
+        documentos = {documento.id: documento for documento in self.modelo.objects(id__in=ids)}
+        return [documentos[id_] for id_ in ids if id_ in documentos]
+
+    def memoria(self):
+        with self._lock:
+            arrays = self._ids.nbytes + self._ativos.nbytes + sum(coluna.nbytes for coluna in self._colunas.values())
+            return {
+                "pronto": self.pronto,
+                "documentos": int(self._ativos.sum()) + len(self._pendentes),
+                "bytes_arrays": arrays,
+                # Estimativa do dict id -> posição (tabela + chaves de 12 bytes + inteiros)
+                "bytes_indice": sys.getsizeof(self._posicoes) + len(self._posicoes) * (sys.getsizeof(bytes(12)) + 28),
+            }
+
+
+snapshots = {
+    Planeta: SnapshotColunar(Planeta, ["periodo_orbital", "distancia_da_estrela", "raio", "massa", "data_descoberta"]),
+    Estrela: SnapshotColunar(Estrela, ["magnitude", "distancia", "luminosidade", "temperatura", "idade"]),
+}
+
+
+def snapshot_para(modelo):
+    """Snapshot pronto para o modelo, ou None se desativado ou ainda carregando."""
+    snapshot = snapshots.get(modelo) if settings.SNAPSHOT_COLUNAR else None
+    return snapshot if snapshot is not None and snapshot.pronto else None
+
+
+def iniciar_snapshots():
+    if not settings.SNAPSHOT_COLUNAR:
+        return
+    for snapshot in snapshots.values():
+        threading.Thread(target=snapshot.carregar, name=f"snapshot-{snapshot.modelo.__name__}", daemon=True).start()
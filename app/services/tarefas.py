@@ -0,0 +1,83 @@
+import itertools
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from config import settings
+
+
+class Tarefa:
+    def __init__(self, id, tipo, funcao, args):
+        self.id = id
+        self.tipo = tipo
+        self.funcao = funcao
+        self.args = args
+        self.status = "pendente"
+        self.progresso = {}
+        self.erro = None
+        self.criada_em = datetime.utcnow()
+        self.concluida_em = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "status": self.status,
+            "progresso": self.progresso,
+            "erro": self.erro,
+            "criada_em": self.criada_em,
+            "concluida_em": self.concluida_em,
+        }
+
+
+class FilaTarefas:
+    """Fila em memória executada por threads do próprio worker.
+
+    As funções enfileiradas recebem a tarefa como primeiro argumento e
+    registram o andamento em `tarefa.progresso`. Apenas as últimas
+    `historico` tarefas ficam disponíveis para consulta.
+    """
+
+    def __init__(self, workers=1, historico=500):
+        self._fila = queue.Queue()
+        self._tarefas = OrderedDict()
+        self._historico = historico
+        self._contador = itertools.count(1)
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._executar, name=f"tarefas-{i}", daemon=True).start()
+
+    def enfileirar(self, tipo, funcao, *args):
+        with self._lock:
+            tarefa = Tarefa(str(next(self._contador)), tipo, funcao, args)
+            self._tarefas[tarefa.id] = tarefa
+            while len(self._tarefas) > self._historico:
+                self._tarefas.popitem(last=False)
+        self._fila.put(tarefa)
+        return tarefa
+
+    def obter(self, tarefa_id):
+        with self._lock:
+            return self._tarefas.get(tarefa_id)
+
+    def listar(self):
+        with self._lock:
+            return list(self._tarefas.values())
+
+    def _executar(self):
+        while True:
+            tarefa = self._fila.get()
+            tarefa.status = "executando"
+            try:
+                tarefa.funcao(tarefa, *tarefa.args)
+                tarefa.status = "concluida"
+            except Exception as e:
+                tarefa.status = "erro"
+                tarefa.erro = str(e)
+                print(f"❌ Erro na tarefa {tarefa.id} ({tarefa.tipo}):", e)
+            finally:
+                tarefa.concluida_em = datetime.utcnow()
+                self._fila.task_done()
+
+
+fila_tarefas = FilaTarefas(settings.TAREFAS_WORKERS, settings.TAREFAS_HISTORICO)
@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+# Os módulos da aplicação são importados a partir de app/ (ex.: `from services import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def banco():
+    """mongoengine conectado a um MongoDB em memória (mongomock)."""
+    mongomock = pytest.importorskip("mongomock")
+    import mongoengine
+
+    mongoengine.connect("testes", alias="default", mongo_client_class=mongomock.MongoClient, uuidRepresentation="standard")
+    yield mongoengine.get_db()
+    mongoengine.disconnect(alias="default")
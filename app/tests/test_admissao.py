@@ -0,0 +1,47 @@
+import asyncio
+import json
+from services.admissao import AdmissaoMiddleware
+
+
+async def _eco(scope, receive, send):
+    corpo = b""
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get("body", b"")
+        if not mensagem.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _enviar(partes):
+    mensagens = [
+        {"type": "http.request", "body": parte, "more_body": indice < len(partes) - 1}
+        for indice, parte in enumerate(partes)
+    ]
+    respostas = []
+
+    async def receive():
+        if mensagens:
+            return mensagens.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(mensagem):
+        respostas.append(mensagem)
+
+    scope = {"type": "http", "method": "POST", "path": "/estrelas/", "headers": [(b"content-type", b"application/json")]}
+    await asyncio.wait_for(AdmissaoMiddleware(_eco)(scope, receive, send), timeout=5)
+    return respostas
+
+
+def test_corpo_lido_durante_a_admissao_chega_a_aplicacao():
+    corpo = json.dumps({"nome": "Sol", "tipo_espectral": "G2V"}).encode()
+    respostas = asyncio.run(_enviar([corpo]))
+    assert respostas[0]["status"] == 200
+    assert respostas[1]["body"] == corpo
+
+
+def test_corpo_em_varias_partes():
+    respostas = asyncio.run(_enviar([b'{"nome": ', b'"Sol"}']))
+    assert respostas[0]["status"] == 200
+    assert respostas[1]["body"] == b'{"nome": "Sol"}'
@@ -0,0 +1,85 @@
+import re
+import pytest
+from fastapi import HTTPException
+from config import settings
+from models.planeta import Planeta
+from services.filtros import EspecificacaoFiltro
+
+
+def _especificacao():
+    return EspecificacaoFiltro(
+        Planeta,
+        texto=["nome", "tipo"],
+        intervalos=["raio", "massa"],
+        datas=["data_descoberta"],
+        ordenaveis=["nome", "raio", "massa"],
+    )
+
+
+def test_ordenacao_fora_da_lista_responde_400(banco):
+    with pytest.raises(HTTPException) as erro:
+        _especificacao().compilar("composicao_atmosferica")
+    assert erro.value.status_code == 400
+    assert "nome, raio, massa" in erro.value.detail
+
+
+def test_parametro_desconhecido_e_recusado(banco):
+    with pytest.raises(ValueError):
+        _especificacao().compilar(gravidade=1)
+
+
+def test_texto_e_buscado_literalmente(banco):
+    consulta = _especificacao().compilar(nome="Kepler-22b (candidato)*")
+    assert consulta.query == {"nome": {"$regex": re.escape("Kepler-22b (candidato)*"), "$options": "i"}}
+    assert consulta.textos == ["nome"]
+
+
+def test_intervalos_e_datas(banco):
+    consulta = _especificacao().compilar(raio_min=1.5, raio_max=3, data_descoberta_inicio="2020-01-01T00:00:00")
+    assert consulta.query["raio"] == {"$gte": 1.5, "$lte": 3}
+    assert set(consulta.query["data_descoberta"]) == {"$gte"}
+    with pytest.raises(HTTPException) as erro:
+        _especificacao().compilar(data_descoberta_fim="ontem")
+    assert erro.value.status_code == 400
+
+
+@pytest.mark.parametrize("ordenacao, parametros, hint", [
+    ("raio", {}, "raio_1"),
+    ("raio", {"raio_min": 1}, "raio_1"),
+    ("nome", {"nome": "Kep"}, "nome_1"),
+    ("massa", {"raio_min": 1}, None),
+    (None, {"raio_min": 1}, None),
+])
+def test_hint_da_ordenacao(banco, ordenacao, parametros, hint):
+    consulta = _especificacao().compilar(ordenacao, False, **parametros)
+    assert consulta.hint == hint
+    assert consulta.ordem == (f"-{ordenacao}" if ordenacao else None)
+
+
+def test_consultas_iguais_compartilham_a_compilacao(banco):
+    especificacao = _especificacao()
+    assert especificacao.compilar("raio", raio_min=1, nome=None) is especificacao.compilar("raio", raio_min=1)
+
+
+def test_planos_sem_indice_sao_recusados_em_colecoes_grandes(banco, monkeypatch):
+    especificacao = _especificacao()
+    especificacao.compilar(nome="Kep")
+    especificacao.compilar("massa", raio_min=1)
+
+    monkeypatch.setattr(settings, "FILTRO_LIMITE_VARREDURA", 10)
+    Planeta._get_collection().insert_many([{"nome": f"P{i}"} for i in range(20)])
+    especificacao = _especificacao()
+    for ordenacao, parametros in ((None, {"nome": "Kep"}), ("massa", {"raio_min": 1})):
+        with pytest.raises(HTTPException) as erro:
+            especificacao.compilar(ordenacao, **parametros)
+        assert erro.value.status_code == 400
+    especificacao.compilar("raio", raio_min=1)
+    especificacao.compilar(nome="Kep", raio_min=1)
+    # Sem verificar, o plano fica para quem executar no MongoDB (ex.: após o snapshot)
+    especificacao.compilar("massa", verificar=False, raio_min=1)
+
+
+def test_modelo_so_com_texto_nao_e_limitado(banco, monkeypatch):
+    monkeypatch.setattr(settings, "FILTRO_LIMITE_VARREDURA", 10)
+    Planeta._get_collection().insert_many([{"nome": f"P{i}"} for i in range(20)])
+    EspecificacaoFiltro(Planeta, texto=["nome"], ordenaveis=["nome"]).compilar(nome="P1")
@@ -0,0 +1,43 @@
+import asyncio
+import gzip
+from services.negociacao import NegociacaoMiddleware
+
+
+def _executar(app, enviadas=None, aceitar_codificacao="gzip"):
+    enviadas = [] if enviadas is None else enviadas
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", aceitar_codificacao.encode())]}
+    asyncio.run(NegociacaoMiddleware(app, tamanho_minimo=10)(scope, receive, send))
+    return enviadas
+
+
+def test_sse_envia_cabecalhos_antes_do_primeiro_evento():
+    enviadas_antes_do_corpo, mensagens = [], []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        enviadas_antes_do_corpo.append(len(mensagens))
+        await send({"type": "http.response.body", "body": b"data: 1\n\n", "more_body": False})
+
+    _executar(app, mensagens)
+    assert enviadas_antes_do_corpo == [1]
+    assert mensagens[0]["type"] == "http.response.start"
+    assert mensagens[1]["body"] == b"data: 1\n\n"
+
+
+def test_resposta_completa_e_comprimida():
+    corpo = b'{"valor": "' + b"x" * 100 + b'"}'
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": corpo})
+
+    inicio, mensagem = _executar(app)
+    assert (b"content-encoding", b"gzip") in inicio["headers"]
+    assert gzip.decompress(mensagem["body"]) == corpo
@@ -0,0 +1,43 @@
+import asyncio
+import time
+from services.single_flight import SingleFlight, coalescer, single_flight
+
+
+def test_chamadas_concorrentes_executam_uma_vez():
+    execucoes = []
+
+    def consulta():
+        execucoes.append(1)
+        time.sleep(0.05)
+        return {"total": 1}
+
+    async def principal():
+        agrupador = SingleFlight()
+        return await asyncio.gather(*[agrupador.executar("chave", consulta) for _ in range(20)]), agrupador
+
+    resultados, agrupador = asyncio.run(principal())
+    assert len(execucoes) == 1
+    assert all(resultado == {"total": 1} for resultado in resultados)
+    assert agrupador.metricas() == {"executadas": 1, "agrupadas": 19, "em_andamento": 0}
+
+
+def test_excecao_chega_a_todos_os_que_aguardam():
+    def consulta():
+        time.sleep(0.05)
+        raise ValueError("falhou")
+
+    async def principal():
+        agrupador = SingleFlight()
+        return await asyncio.gather(*[agrupador.executar("chave", consulta) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(resultado, ValueError) for resultado in asyncio.run(principal()))
+
+
+def test_coalescer_torna_o_handler_assincrono():
+    @coalescer
+    def handler(skip: int = 0, limit: int = 10):
+        return {"skip": skip, "limit": limit}
+
+    assert asyncio.iscoroutinefunction(handler)
+    assert asyncio.run(handler(skip=5, limit=2)) == {"skip": 5, "limit": 2}
+    assert single_flight.metricas()["em_andamento"] == 0
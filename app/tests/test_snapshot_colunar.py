@@ -0,0 +1,121 @@
+import random
+import pytest
+from bson import ObjectId
+from models.planeta import Planeta
+from services import snapshot_colunar
+from services.snapshot_colunar import SnapshotColunar
+
+CAMPOS = ["periodo_orbital", "raio", "massa"]
+
+
+class _HubSemEventos:
+    suportado = True
+
+    def adicionar_ouvinte(self, callback):
+        pass
+
+
+@pytest.fixture
+def colecao(banco, monkeypatch):
+    monkeypatch.setattr(snapshot_colunar, "hub_para", lambda modelo: _HubSemEventos())
+    gerador = random.Random(42)
+    documentos = []
+    for i in range(300):
+        # Ids terminando em bytes nulos: o array "S12" os descarta ao devolver um elemento
+        id_ = ObjectId(bytes([i % 256, i // 256]) + bytes(9) + (b"\0" if i % 3 == 0 else b"\x07"))
+        documento = {"_id": id_, "nome": f"P{i}"}
+        for campo in CAMPOS:
+            # Valores distintos (sem empates na ordenação) e ~15% ausentes ou nulos
+            sorteio = gerador.random()
+            if sorteio < 0.1:
+                continue
+            documento[campo] = None if sorteio < 0.15 else round(gerador.uniform(0, 1000), 6) + i * 1e-7
+        documentos.append(documento)
+    Planeta._get_collection().insert_many(documentos)
+    return Planeta._get_collection()
+
+
+@pytest.fixture
+def snapshot(colecao):
+    snapshot = SnapshotColunar(Planeta, CAMPOS)
+    snapshot.carregar()
+    assert snapshot.pronto
+    return snapshot
+
+
+def _mongo(colecao, intervalos, ordenacao, ascendente, skip, limit):
+    query = {}
+    for campo, (minimo, maximo) in intervalos.items():
+        condicao = {}
+        if minimo is not None:
+            condicao["$gte"] = minimo
+        if maximo is not None:
+            condicao["$lte"] = maximo
+        query[campo] = condicao
+    cursor = colecao.find(query)
+    if ordenacao:
+        cursor = cursor.sort(ordenacao, 1 if ascendente else -1)
+    documentos = list(cursor)
+    return len(documentos), documentos[skip:skip + limit]
+
+
+def _valor(colecao, id_, campo):
+    return colecao.find_one({"_id": id_}).get(campo)
+
+
+CASOS = [
+    ({}, None, True, 0, 50),
+    ({"raio": (100, 600)}, None, True, 0, 300),
+    ({"raio": (None, 250)}, None, True, 5, 10),
+    ({"massa": (400, None), "periodo_orbital": (None, 900)}, None, True, 0, 300),
+    ({}, "raio", True, 0, 20),
+    ({}, "raio", False, 0, 20),
+    ({"massa": (100, 800)}, "periodo_orbital", True, 10, 15),
+    ({"massa": (100, 800)}, "periodo_orbital", False, 10, 15),
+    ({"raio": (200, 700)}, "raio", False, 0, 300),
+    ({"raio": (5000, None)}, "raio", True, 0, 10),
+    ({}, "massa", True, 290, 50),
+]
+
+
+@pytest.mark.parametrize("intervalos, ordenacao, ascendente, skip, limit", CASOS)
+def test_filtrar_equivale_a_consulta_no_mongo(colecao, snapshot, intervalos, ordenacao, ascendente, skip, limit):
+    total, ids = snapshot.filtrar(intervalos, ordenacao, ascendente, skip, limit)
+    total_mongo, esperados = _mongo(colecao, intervalos, ordenacao, ascendente, skip, limit)
+
+    assert total == total_mongo
+    assert len(ids) == len(esperados)
+    if ordenacao:
+        # Ausentes empatam entre si; a ordem dos valores precisa coincidir
+        assert [_valor(colecao, id_, ordenacao) for id_ in ids] == [documento.get(ordenacao) for documento in esperados]
+        valores_presentes = {documento["_id"] for documento in esperados if documento.get(ordenacao) is not None}
+        assert valores_presentes <= set(ids)
+    else:
+        assert ids == [documento["_id"] for documento in esperados]
+
+
+def test_ids_com_bytes_nulos_no_fim_sao_preservados(colecao, snapshot):
+    _, ids = snapshot.filtrar({}, None, True, 0, 300)
+    assert set(ids) == {documento["_id"] for documento in colecao.find({}, {"_id": 1})}
+    assert [planeta.id for planeta in snapshot.buscar(ids[:30])] == ids[:30]
+
+
+def test_eventos_atualizam_o_snapshot(colecao, snapshot):
+    documento = colecao.find_one({"raio": {"$gte": 0}})
+    novo_id = ObjectId()
+    snapshot._aplicar({"documento_id": str(documento["_id"]), "operacao": "delete", "documento": None})
+    snapshot._aplicar({"documento_id": str(novo_id), "operacao": "insert", "documento": {"_id": novo_id, "raio": 1e6}})
+
+    total, ids = snapshot.filtrar({"raio": (documento["raio"], documento["raio"])})
+    assert documento["_id"] not in ids
+    assert snapshot.filtrar({"raio": (1e5, None)}) == (1, [novo_id])
+
+
+def test_snapshot_nao_carrega_sem_change_stream(banco, monkeypatch):
+    class _HubSemSuporte(_HubSemEventos):
+        suportado = False
+
+    monkeypatch.setattr(snapshot_colunar, "hub_para", lambda modelo: _HubSemSuporte())
+    snapshot = SnapshotColunar(Planeta, CAMPOS)
+    snapshot.carregar()
+    assert not snapshot.pronto